@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Response Compression Benchmark
+Compares bytes on the wire and requests/sec for /api/posts with and without gzip
+
+Usage:
+    python benchmark_compression.py --email user@example.com --password secret
+    python benchmark_compression.py --token <jwt> --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+
+def print_header(text):
+    print("\n" + "=" * 60)
+    print(f"  {text}")
+    print("=" * 60)
+
+
+async def get_token(client, args):
+    if args.token:
+        return args.token
+    response = await client.post(
+        f"{args.base_url}/api/auth/login",
+        json={"email": args.email, "password": args.password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run(client, args, token, encoding):
+    """Fire args.requests GETs with the given Accept-Encoding, args.concurrency at a time"""
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": encoding}
+    url = f"{args.base_url}/api/posts?limit={args.limit}"
+    semaphore = asyncio.Semaphore(args.concurrency)
+    wire_bytes = []
+
+    async def one():
+        async with semaphore:
+            response = await client.get(url, headers=headers)
+            response.raise_for_status()
+            wire_bytes.append(response.num_bytes_downloaded)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "bytes_per_response": sum(wire_bytes) / len(wire_bytes),
+        "requests_per_sec": len(wire_bytes) / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--token")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--limit", type=int, default=50, help="posts per page")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    if not args.token and not (args.email and args.password):
+        parser.error("pass --token or --email and --password")
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        token = await get_token(client, args)
+        results = {}
+        for label, encoding in (("identity", "identity"), ("gzip", "gzip")):
+            # Warm up connections and caches before measuring
+            await client.get(f"{args.base_url}/api/posts?limit={args.limit}",
+                             headers={"Authorization": f"Bearer {token}", "Accept-Encoding": encoding})
+            results[label] = await run(client, args, token, encoding)
+
+    print_header(f"GET /api/posts?limit={args.limit} ({args.requests} requests, concurrency {args.concurrency})")
+    print(f"{'encoding':<10} {'bytes/response':>16} {'requests/sec':>14}")
+    for label, result in results.items():
+        print(f"{label:<10} {result['bytes_per_response']:>16.0f} {result['requests_per_sec']:>14.1f}")
+
+    identity, gzip = results["identity"], results["gzip"]
+    if identity["bytes_per_response"]:
+        saved = 1 - gzip["bytes_per_response"] / identity["bytes_per_response"]
+        print(f"\ngzip saves {saved:.0%} of response bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,108 @@
+"""
+MongoDB connection pool monitoring.
+
+PoolMonitor listens to pymongo's connection pool events and keeps the numbers a
+load balancer needs to decide whether a worker can still take traffic: connections
+in use, recent checkout wait times and checkout failures (pool exhausted/timeouts).
+"""
+import threading
+import time
+from collections import Counter, deque
+
+from pymongo import monitoring
+
+
+def percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Pool counters and a window of recent checkout wait times (milliseconds).
+
+    Check-out started and checked-out events fire on the same thread, so the start
+    time is kept in a thread-local to measure the wait.
+    """
+
+    def __init__(self, max_pool_size: int, window: int = 1000):
+        self.max_pool_size = max_pool_size
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.wait_times = deque(maxlen=window)
+        self.failure_times = deque(maxlen=window)
+        self.in_use = 0
+        self.open_connections = 0
+        self.stats = Counter()
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.monotonic()
+
+    def connection_checked_out(self, event):
+        started = getattr(self.local, "started", None)
+        with self.lock:
+            self.in_use += 1
+            self.stats["checked_out"] += 1
+            if started is not None:
+                self.wait_times.append((time.monotonic() - started) * 1000)
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.stats[f"checkout_failed_{event.reason}"] += 1
+            self.stats["checkout_failed"] += 1
+            self.failure_times.append(time.monotonic())
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open_connections -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.stats["pool_cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def recent_failures(self, seconds: float) -> int:
+        """Checkout failures within the last `seconds`"""
+        cutoff = time.monotonic() - seconds
+        with self.lock:
+            return sum(1 for failed_at in self.failure_times if failed_at >= cutoff)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            wait_times = list(self.wait_times)
+            in_use = self.in_use
+            open_connections = self.open_connections
+            stats = dict(self.stats)
+        return {
+            "max_pool_size": self.max_pool_size,
+            "in_use": in_use,
+            "open_connections": open_connections,
+            "saturation": in_use / self.max_pool_size if self.max_pool_size else 0.0,
+            "checkout_wait_ms": {
+                "p50": percentile(wait_times, 0.5),
+                "p95": percentile(wait_times, 0.95),
+                "max": max(wait_times, default=0.0)
+            },
+            **stats
+        }
@@ -0,0 +1,153 @@
+"""
+Near-duplicate detection for generated tweets.
+
+Each posted tweet is reduced to a 128-value MinHash signature over word shingles.
+The share of positions where two signatures agree estimates the Jaccard similarity
+of the tweets' shingle sets, which keeps one inserted or swapped word close to the
+original (SimHash over the few shingles of a tweet moved such edits 12-18 bits, as
+far as unrelated tweets on the same topic). Candidates are compared against a
+user's most recent signatures at once, vectorized with numpy.
+"""
+import hashlib
+import re
+from typing import Awaitable, Callable, Iterable, Optional
+
+import numpy as np
+from cachetools import TTLCache
+
+TOKEN_PATTERN = re.compile(r"[#@]?\w+")
+URL_PATTERN = re.compile(r"https?://\S+")
+
+NUM_PERMUTATIONS = 128
+SIGNATURE_BYTES = NUM_PERMUTATIONS * 4
+# Universal hashing (a * x + b) mod p with p a prime just above 2**32; a < 2**31
+# keeps a * x + b inside uint64 for 32-bit shingle hashes
+MINHASH_PRIME = np.uint64(4294967311)
+_rng = np.random.default_rng(20240501)
+MINHASH_A = _rng.integers(1, 2 ** 31, size=NUM_PERMUTATIONS, dtype=np.uint64)
+MINHASH_B = _rng.integers(0, 2 ** 31, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingles(text: str, size: int = 2) -> list:
+    """Lowercased word n-grams of a tweet, ignoring links and punctuation"""
+    tokens = TOKEN_PATTERN.findall(URL_PATTERN.sub(" ", text.lower()))
+    if len(tokens) < size:
+        return tokens
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (uint32 per permutation) of a tweet's shingle set"""
+    features = set(shingles(text))
+    if not features:
+        return np.full(NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=4).digest(), 'little') for f in features],
+        dtype=np.uint64
+    )
+    # One row per shingle, one column per permutation; keep each column's minimum
+    permuted = (np.outer(hashes, MINHASH_A) + MINHASH_B) % MINHASH_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarities(signature: np.ndarray, signatures: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity between one signature and a (n, NUM_PERMUTATIONS) array"""
+    return (signatures == signature).mean(axis=1)
+
+
+def to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype('<u4').tobytes()
+
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype='<u4').astype(np.uint32)
+
+
+class SignatureBuffer:
+    """
+    A user's most recent signatures, at most `capacity` of them.
+
+    Storage grows by doubling up to `capacity`; after that each new signature
+    overwrites the oldest in place, so adding one never copies the whole array.
+    """
+
+    def __init__(self, signatures: np.ndarray, capacity: int):
+        self.capacity = capacity
+        self.count = min(len(signatures), capacity)
+        self.data = np.empty((max(self.count, min(capacity, 16)), NUM_PERMUTATIONS), dtype=np.uint32)
+        self.data[:self.count] = signatures[len(signatures) - self.count:]
+        self.oldest = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def signatures(self) -> np.ndarray:
+        return self.data[:self.count]
+
+    def append(self, signature: np.ndarray) -> bool:
+        """Add a signature; returns True when the storage had to grow"""
+        grew = False
+        if self.count == len(self.data) and self.count < self.capacity:
+            data = np.empty((min(2 * self.count, self.capacity), NUM_PERMUTATIONS), dtype=np.uint32)
+            data[:self.count] = self.data
+            self.data = data
+            grew = True
+        if self.count < len(self.data):
+            self.data[self.count] = signature
+            self.count += 1
+        else:
+            self.data[self.oldest] = signature
+            self.oldest = (self.oldest + 1) % self.count
+        return grew
+
+
+class FingerprintIndex:
+    """
+    Per-user in-memory signature buffers, lazily loaded from the database.
+
+    `loader(user_id, limit)` returns the user's `limit` most recent stored signatures,
+    newest first; only those are compared against. The cache is bounded by the bytes
+    the buffers hold, and entries expire after `ttl` seconds so fingerprints recorded
+    by other workers are picked up eventually.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, int], Awaitable[Iterable[np.ndarray]]],
+        history: int = 5000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: int = 300
+    ):
+        self.loader = loader
+        self.history = history
+        # Room for at least one full buffer, which TTLCache would otherwise refuse
+        self.cache = TTLCache(
+            maxsize=max(max_bytes, history * SIGNATURE_BYTES),
+            ttl=ttl,
+            getsizeof=lambda buffer: buffer.nbytes
+        )
+
+    async def get(self, user_id: str) -> np.ndarray:
+        buffer = self.cache.get(user_id)
+        if buffer is None:
+            newest_first = list(await self.loader(user_id, self.history))
+            signatures = np.array(newest_first[::-1], dtype=np.uint32).reshape(-1, NUM_PERMUTATIONS)
+            buffer = SignatureBuffer(signatures, self.history)
+            self.cache[user_id] = buffer
+        return buffer.signatures
+
+    async def most_similar(self, user_id: str, text: str) -> Optional[float]:
+        """Highest estimated similarity of `text` to any of the user's tweets, None if they have none"""
+        signatures = await self.get(user_id)
+        if len(signatures) == 0:
+            return None
+        return float(similarities(minhash(text), signatures).max())
+
+    def add(self, user_id: str, signature: np.ndarray):
+        buffer = self.cache.get(user_id)
+        if buffer is not None and buffer.append(signature):
+            # Re-insert so the cache accounts for the larger buffer
+            self.cache[user_id] = buffer
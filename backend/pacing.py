@@ -0,0 +1,93 @@
+"""
+Send-time spreading for scheduled posts.
+
+Every schedule gets a stable jitter in [0, 1) that places it inside the spread window
+after each scheduler slot, and AdaptivePacer bounds how many posts are generated at
+once, backing off when Gemini or Twitter slow down or report quota errors.
+"""
+import asyncio
+import hashlib
+import time
+from collections import Counter
+from typing import Optional
+
+QUOTA_ERROR_MARKERS = ("429", "too many requests", "rate limit", "quota", "resource_exhausted")
+
+
+def stable_jitter(key: str) -> float:
+    """Deterministic fraction in [0, 1) derived from `key`"""
+    digest = hashlib.sha256(key.encode('utf-8')).digest()
+    return (int.from_bytes(digest[:8], 'big') >> 11) / 2 ** 53
+
+
+def is_quota_error(message: str) -> bool:
+    message = message.lower()
+    return any(marker in message for marker in QUOTA_ERROR_MARKERS)
+
+
+class AdaptivePacer:
+    """
+    AIMD concurrency limit for provider calls.
+
+    Each completed call adds one slot while the smoothed latency stays under
+    `target_latency`; slow calls take one slot away and quota errors halve the
+    limit and pause new dispatches for `backoff` seconds.
+    """
+
+    def __init__(self, min_concurrency: int, max_concurrency: int, target_latency: float, backoff: float = 30.0):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.concurrency = min_concurrency
+        self.in_flight = 0
+        self.latency = None
+        self.paused_until = 0.0
+        self.condition = asyncio.Condition()
+        self.stats = Counter()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            try:
+                await asyncio.sleep(pause)
+            except asyncio.CancelledError:
+                await self.cancel()
+                raise
+        return time.monotonic()
+
+    async def cancel(self):
+        """Give back an acquired slot unused, without counting it as a call"""
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def release(self, started: float, error: Optional[str] = None):
+        elapsed = time.monotonic() - started
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+        if error and is_quota_error(error):
+            self.stats["quota_errors"] += 1
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+            self.paused_until = time.monotonic() + self.backoff
+        elif self.latency > self.target_latency:
+            self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+        self.stats["completed"] += 1
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "latency_ewma": self.latency,
+            **self.stats
+        }
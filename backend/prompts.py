@@ -0,0 +1,174 @@
+"""
+Prompt building for tweet generation.
+
+Templates are versioned so a content config keeps generating with the prompt it was
+tuned against. Built prompts are cached per config, and tweet length is measured the
+way Twitter counts it (weighted characters) so fitting a tweet never over-trims.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+TWEET_MAX_WEIGHTED_LENGTH = 280
+TWEET_URL_LENGTH = 23
+
+LENGTH_HINTS = {
+    "short": "50-100 characters",
+    "medium": "100-200 characters",
+    "long": "200-280 characters"
+}
+
+
+class PromptTemplate(NamedTuple):
+    system: Optional[str]
+    user: str
+    # Output token cap per length; None leaves the model default
+    max_output_tokens: Optional[dict] = None
+
+
+class Prompt(NamedTuple):
+    system: Optional[str]
+    user: str
+    max_output_tokens: Optional[int]
+
+
+PROMPT_TEMPLATES = {
+    # Original single-message prompt
+    "v1": PromptTemplate(
+        system=None,
+        user="""You are an expert social media content creator. Generate an engaging tweet that is exactly within Twitter's 280 character limit.
+
+Generate a tweet about: {topic}
+
+Tone: {tone}
+Length: {length}
+Include hashtags: {hashtags}
+Include emojis: {emojis}
+
+Rules:
+1. Must be under 280 characters
+2. Be engaging and authentic
+3. No quotes around the tweet
+4. Just return the tweet text, nothing else"""
+    ),
+    # Fixed instructions moved to the system instruction; the per-call message only
+    # carries the config, and the output is capped near the requested length
+    "v2": PromptTemplate(
+        system=(
+            "You are an expert social media content creator writing engaging, authentic tweets. "
+            "Reply with the tweet text only, without quotes. "
+            "Twitter counts emojis as 2 characters and links as 23; the whole tweet must fit in 280."
+        ),
+        user="Topic: {topic}\nTone: {tone}\nLength: {length}\nHashtags: {hashtags}\nEmojis: {emojis}",
+        max_output_tokens={"short": 64, "medium": 112, "long": 160}
+    ),
+}
+
+# New configs get the latest template; configs stored before templates were
+# versioned have no prompt_version and keep the original one
+LATEST_PROMPT_VERSION = "v2"
+LEGACY_PROMPT_VERSION = "v1"
+
+
+@lru_cache(maxsize=4096)
+def _build(version: str, topic: str, tone: str, length: str, hashtags: bool, emojis: bool) -> Prompt:
+    template = PROMPT_TEMPLATES[version]
+    user = template.user.format(
+        topic=topic,
+        tone=tone,
+        length=LENGTH_HINTS.get(length, 'medium'),
+        hashtags='Yes' if hashtags else 'No',
+        emojis='Yes' if emojis else 'No'
+    )
+    max_output_tokens = template.max_output_tokens.get(length, template.max_output_tokens["medium"]) if template.max_output_tokens else None
+    return Prompt(template.system, user, max_output_tokens)
+
+
+def build_prompt(content_config: dict) -> Prompt:
+    """Prompt for a content config, rendered once per distinct config"""
+    return _build(
+        content_config.get('prompt_version') or LEGACY_PROMPT_VERSION,
+        content_config['topic'],
+        content_config['tone'],
+        content_config['length'],
+        bool(content_config.get('hashtags')),
+        bool(content_config.get('emojis'))
+    )
+
+
+# ===== Twitter weighted length =====
+URL_PATTERN = re.compile(r"https?://\S+")
+# Code point ranges Twitter counts as one character; everything else counts as two
+LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+EMOJI_MODIFIERS = set(range(0x1F3FB, 0x1F400)) | {0xFE0F, 0x20E3}
+ZWJ = 0x200D
+
+
+def _char_weight(code_point: int) -> int:
+    for low, high in LIGHT_RANGES:
+        if low <= code_point <= high:
+            return 1
+    return 2
+
+
+def _is_emoji(code_point: int) -> bool:
+    return code_point >= 0x1F000 or 0x2600 <= code_point <= 0x27BF
+
+
+def _text_length(text: str) -> int:
+    text = unicodedata.normalize('NFC', text)
+    length = 0
+    i = 0
+    while i < len(text):
+        code_point = ord(text[i])
+        if _is_emoji(code_point):
+            # An emoji sequence (modifiers, keycaps, ZWJ joins, flag pairs) counts as 2
+            i += 1
+            while i < len(text):
+                following = ord(text[i])
+                if following in EMOJI_MODIFIERS:
+                    i += 1
+                elif following == ZWJ and i + 1 < len(text):
+                    i += 2
+                elif 0x1F1E6 <= code_point <= 0x1F1FF and 0x1F1E6 <= following <= 0x1F1FF:
+                    i += 1
+                    code_point = 0
+                else:
+                    break
+            length += 2
+        else:
+            length += _char_weight(code_point)
+            i += 1
+    return length
+
+
+def weighted_length(text: str) -> int:
+    """Length of a tweet as Twitter counts it against the 280 limit"""
+    length = 0
+    position = 0
+    for match in URL_PATTERN.finditer(text):
+        length += _text_length(text[position:match.start()]) + TWEET_URL_LENGTH
+        position = match.end()
+    return length + _text_length(text[position:])
+
+
+def fit_tweet(text: str, limit: int = TWEET_MAX_WEIGHTED_LENGTH) -> str:
+    """
+    Trim a tweet to `limit` weighted characters.
+
+    Cuts at the last whole word that fits and ends with an ellipsis, instead of
+    slicing through a word or hashtag.
+    """
+    if weighted_length(text) <= limit:
+        return text
+
+    words = text.split(' ')
+    while words and weighted_length(' '.join(words) + '…') > limit:
+        words.pop()
+    if not words:
+        # A single word longer than the limit: fall back to a character cut
+        while text and weighted_length(text + '…') > limit:
+            text = text[:-1]
+        return text + '…'
+    return ' '.join(words).rstrip(' ,;:-') + '…'
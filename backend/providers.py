@@ -0,0 +1,299 @@
+"""
+Tweet generation providers.
+
+Every backend turns a content config into raw tweet text and keeps its own latency
+and error metrics. ProviderRouter orders the backends by latency, cost or configured
+priority, skips ones whose circuit is open, and falls back to the next on failure.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from prompts import build_prompt
+
+
+class ProviderUnavailable(Exception):
+    pass
+
+
+class GenerationProvider:
+    """Base class: subclasses implement `_generate` and set `name` and relative `cost`"""
+
+    name = "base"
+    cost = 1.0
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency = None
+        self.consecutive_errors = 0
+        self.open_until = 0.0
+        self.stats = Counter()
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    async def generate(self, content_config: dict, avoid: Optional[str] = None) -> str:
+        started = time.monotonic()
+        self.stats["calls"] += 1
+        try:
+            text = await self._generate(content_config, avoid)
+        except Exception:
+            self.record_error()
+            raise
+
+        elapsed = time.monotonic() - started
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+        self.consecutive_errors = 0
+        return text
+
+    def record_error(self, timeout: bool = False):
+        """
+        Count a failed call. Cancellation is not a failure: the router records its own
+        timeouts here, and a caller giving up (e.g. scheduler shutdown) says nothing
+        about the provider.
+        """
+        self.stats["errors"] += 1
+        if timeout:
+            self.stats["timeouts"] += 1
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= self.failure_threshold:
+            # Open the circuit: stop routing here until the cooldown passes
+            self.open_until = time.monotonic() + self.cooldown
+            self.stats["circuit_opened"] += 1
+
+    async def _generate(self, content_config: dict, avoid: Optional[str]) -> str:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        return {
+            "cost": self.cost,
+            "available": self.available(),
+            "latency_ewma": self.latency,
+            "consecutive_errors": self.consecutive_errors,
+            **self.stats
+        }
+
+
+def prompt_contents(content_config: dict, avoid: Optional[str]):
+    prompt = build_prompt(content_config)
+    contents = prompt.user
+    if avoid:
+        contents += f"\nMust be clearly different from this earlier tweet: {avoid}"
+    return prompt, contents
+
+
+class GeminiProvider(GenerationProvider):
+    name = "gemini"
+    cost = 1.0
+
+    def __init__(self, api_key: str, model: str = 'gemini-2.5-flash', **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.model = model
+        self.client = None
+
+    async def _generate(self, content_config: dict, avoid: Optional[str]) -> str:
+        from google import genai
+        from google.genai import types
+
+        if self.client is None:
+            self.client = genai.Client(api_key=self.api_key)
+
+        prompt, contents = prompt_contents(content_config, avoid)
+        config = None
+        if prompt.system or prompt.max_output_tokens:
+            config = types.GenerateContentConfig(
+                system_instruction=prompt.system,
+                max_output_tokens=prompt.max_output_tokens,
+                # Thinking tokens would count against the small output budget
+                thinking_config=types.ThinkingConfig(thinking_budget=0)
+            )
+
+        response = await asyncio.to_thread(
+            self.client.models.generate_content,
+            model=self.model,
+            contents=contents,
+            config=config
+        )
+        return response.text
+
+
+class LocalModelProvider(GenerationProvider):
+    """
+    Runs a GGUF model on the CPU through llama-cpp-python (optional dependency).
+
+    The model is loaded on first use; llama.cpp contexts are not thread-safe, so
+    calls are serialized.
+    """
+
+    name = "local"
+    cost = 0.1
+
+    def __init__(self, model_path: str, threads: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.model_path = model_path
+        self.threads = threads
+        self.model = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_supported() -> bool:
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _complete(self, messages: list, max_tokens: int) -> str:
+        with self.lock:
+            if self.model is None:
+                from llama_cpp import Llama
+                self.model = Llama(model_path=self.model_path, n_ctx=1024, n_threads=self.threads, verbose=False)
+            result = self.model.create_chat_completion(messages=messages, max_tokens=max_tokens, temperature=0.8)
+        return result["choices"][0]["message"]["content"]
+
+    async def _generate(self, content_config: dict, avoid: Optional[str]) -> str:
+        prompt, contents = prompt_contents(content_config, avoid)
+        messages = [{"role": "user", "content": contents}]
+        if prompt.system:
+            messages.insert(0, {"role": "system", "content": prompt.system})
+        return await asyncio.to_thread(self._complete, messages, prompt.max_output_tokens or 160)
+
+
+class TemplateProvider(GenerationProvider):
+    """
+    Deterministic offline generator filling canned phrasings with the config's topic.
+
+    The phrasing is chosen from a hash of the topic, tone, hour and the text to
+    avoid, so output is reproducible for a given input but varies between slots.
+    """
+
+    name = "template"
+    cost = 0.0
+
+    OPENERS = {
+        "professional": ["Key insight on {topic}:", "Worth knowing about {topic}:", "A quick perspective on {topic}:"],
+        "casual": ["Been thinking about {topic} lately.", "Real talk about {topic}:", "Random thought on {topic}:"],
+        "humorous": ["Plot twist: {topic} is more fun than it sounds.", "Nobody warned me {topic} would be this interesting."],
+        "inspirational": ["Every step in {topic} counts.", "Small progress in {topic} is still progress."],
+        "educational": ["Did you know? {topic} explained in one line:", "Today's lesson on {topic}:"],
+    }
+    BODIES = [
+        "The details matter more than the headlines.",
+        "Consistency beats intensity every time.",
+        "The best results come from asking better questions.",
+        "Start small, measure, and keep improving.",
+        "There is always more to learn than you think.",
+    ]
+    EMOJIS = ["🚀", "💡", "✨", "📈", "🙌"]
+
+    async def _generate(self, content_config: dict, avoid: Optional[str]) -> str:
+        topic = content_config['topic']
+        hour = datetime.now(timezone.utc).strftime('%Y%m%d%H')
+        seed = int.from_bytes(
+            hashlib.sha256(f"{topic}|{content_config.get('tone')}|{hour}|{avoid or ''}".encode('utf-8')).digest()[:8],
+            'big'
+        )
+
+        openers = self.OPENERS.get(content_config.get('tone'), self.OPENERS["professional"])
+        parts = [openers[seed % len(openers)].format(topic=topic), self.BODIES[(seed >> 8) % len(self.BODIES)]]
+        if content_config.get('emojis'):
+            parts.append(self.EMOJIS[(seed >> 16) % len(self.EMOJIS)])
+        if content_config.get('hashtags'):
+            parts.append("#" + "".join(word.capitalize() for word in topic.split() if word.isalnum())[:30])
+        return " ".join(part for part in parts if part and part != "#")
+
+
+class ProviderRouter:
+    """
+    Try providers in routing order until one succeeds.
+
+    Strategies: "priority" keeps the configured order, "latency" prefers the lowest
+    observed latency (untried providers first), "cost" prefers the cheapest.
+    Each attempt is bounded by `timeout` seconds so a slow backend fails over.
+    """
+
+    def __init__(
+        self,
+        providers: List[GenerationProvider],
+        strategy: str = "priority",
+        timeout: float = 30.0,
+        skipped: Optional[Dict[str, str]] = None
+    ):
+        self.providers = providers
+        self.strategy = strategy
+        self.timeout = timeout
+        # Configured provider names left out, with the reason, for startup warnings
+        self.skipped = skipped or {}
+
+    def ordered(self) -> List[GenerationProvider]:
+        providers = [provider for provider in self.providers if provider.available()]
+        if self.strategy == "latency":
+            return sorted(providers, key=lambda p: p.latency or 0.0)
+        if self.strategy == "cost":
+            return sorted(providers, key=lambda p: p.cost)
+        return providers
+
+    async def generate(self, content_config: dict, avoid: Optional[str] = None) -> str:
+        if not self.providers:
+            raise ProviderUnavailable(
+                "No generation provider configured. Please set GEMINI_API_KEY in .env file "
+                "or add the template provider to GENERATION_PROVIDERS"
+            )
+        providers = self.ordered()
+        if not providers:
+            raise ProviderUnavailable("All generation providers are failing, retry later")
+
+        last_error = None
+        for provider in providers:
+            attempt = asyncio.ensure_future(provider.generate(content_config, avoid))
+            try:
+                done, _ = await asyncio.wait({attempt}, timeout=self.timeout)
+            except asyncio.CancelledError:
+                attempt.cancel()
+                raise
+            if not done:
+                attempt.cancel()
+                provider.record_error(timeout=True)
+                last_error = asyncio.TimeoutError(f"{provider.name} provider timed out after {self.timeout}s")
+                continue
+            try:
+                return attempt.result()
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def snapshot(self) -> dict:
+        return {provider.name: provider.snapshot() for provider in self.providers}
+
+
+def build_router(names: List[str], strategy: str, timeout: float) -> ProviderRouter:
+    """Create the configured providers from the environment, recording why any were skipped"""
+    providers = []
+    skipped = {}
+    for name in names:
+        if name == "gemini":
+            api_key = os.environ.get('GEMINI_API_KEY')
+            if api_key and api_key != 'your-gemini-api-key-here':
+                providers.append(GeminiProvider(api_key, os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')))
+            else:
+                skipped[name] = "GEMINI_API_KEY is not set"
+        elif name == "local":
+            model_path = os.environ.get('LOCAL_MODEL_PATH')
+            if not model_path:
+                skipped[name] = "LOCAL_MODEL_PATH is not set"
+            elif not LocalModelProvider.is_supported():
+                skipped[name] = "llama-cpp-python is not installed"
+            else:
+                providers.append(LocalModelProvider(model_path, threads=int(os.environ.get('LOCAL_MODEL_THREADS', '0')) or None))
+        elif name == "template":
+            providers.append(TemplateProvider())
+        else:
+            skipped[name] = "unknown provider, expected gemini, local or template"
+    return ProviderRouter(providers, strategy, timeout, skipped)
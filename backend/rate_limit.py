@@ -0,0 +1,145 @@
+"""
+Rate limiting and admission control.
+
+TokenBucketLimiter keeps buckets in process memory; MongoTokenBucketLimiter keeps
+them in a collection so several replicas share one budget. AdmissionController caps
+how much expensive work runs at once and sheds the rest instead of queueing it.
+"""
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Tuple
+
+from cachetools import LRUCache
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+RATE_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parse "10/minute" into (bucket capacity, tokens refilled per second)"""
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / RATE_PERIODS[period.strip()]
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    pass
+
+
+class TokenBucketLimiter:
+    """In-process token buckets, one per key, least recently used keys evicted first"""
+
+    def __init__(self, rate: str, max_keys: int = 100000):
+        self.capacity, self.refill_rate = parse_rate(rate)
+        self.buckets = LRUCache(maxsize=max_keys)
+        self.stats = Counter()
+
+    async def hit(self, key: str):
+        """Take one token for `key`; raises RateLimited when the bucket is empty"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            self.stats["rejected"] += 1
+            raise RateLimited((1 - tokens) / self.refill_rate)
+
+        self.buckets[key] = (tokens - 1, now)
+        self.stats["allowed"] += 1
+
+
+class MongoTokenBucketLimiter:
+    """
+    Token buckets shared by all replicas through a MongoDB collection.
+
+    Each hit is one atomic pipeline update that refills, checks and spends in place,
+    using the server clock ($$NOW) so replica clock skew does not matter.
+    """
+
+    def __init__(self, collection, rate: str):
+        self.collection = collection
+        self.capacity, self.refill_rate = parse_rate(rate)
+        self.stats = Counter()
+
+    async def hit(self, key: str):
+        try:
+            bucket = await self.update_bucket(key)
+        except DuplicateKeyError:
+            # Two replicas created the same new bucket at once; the retry updates it
+            bucket = await self.update_bucket(key)
+
+        if not bucket["allowed"]:
+            self.stats["rejected"] += 1
+            raise RateLimited((1 - bucket["tokens"]) / self.refill_rate)
+        self.stats["allowed"] += 1
+
+    async def update_bucket(self, key: str) -> dict:
+        elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        return await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [
+                        self.capacity,
+                        {"$add": [{"$ifNull": ["$tokens", self.capacity]}, {"$multiply": [elapsed_seconds, self.refill_rate]}]}
+                    ]},
+                    "updated_at": "$$NOW"
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+            ],
+            projection={"_id": 0, "tokens": 1, "allowed": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+
+class AdmissionController:
+    """
+    Bounded concurrency for one class of work.
+
+    Up to `limit` callers run at once; others wait at most `queue_timeout` seconds
+    for a slot and are then shed with Overloaded.
+    """
+
+    def __init__(self, limit: int, queue_timeout: float = 0.0):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.stats = Counter()
+
+    @asynccontextmanager
+    async def admit(self):
+        if self.semaphore.locked():
+            if self.queue_timeout <= 0:
+                self.stats["shed"] += 1
+                raise Overloaded()
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["shed"] += 1
+                raise Overloaded()
+        else:
+            await self.semaphore.acquire()
+
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, **self.stats}
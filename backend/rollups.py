@@ -0,0 +1,129 @@
+"""
+Pre-aggregated post analytics.
+
+Every written post increments an hourly and a daily rollup document for its user,
+counting posts per status and failures per normalized reason, so a range query
+reads one small document per bucket instead of scanning `posts`. Buckets are keyed
+by the UTC ISO timestamp of their start, matching how posts store `created_at`.
+"""
+import json
+import re
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from pacing import is_quota_error
+
+# Length of the `created_at` prefix identifying each bucket, and the suffix
+# completing it to a full timestamp
+GRANULARITIES = {
+    "hour": (13, ":00:00+00:00"),
+    "day": (10, "T00:00:00+00:00"),
+}
+
+TWITTER_ERROR_PREFIX = "Twitter API error:"
+
+
+def bucket_start(timestamp: str, granularity: str) -> str:
+    """Bucket key for a UTC ISO timestamp, e.g. 2024-05-01T13:00:00+00:00 for an hour"""
+    length, suffix = GRANULARITIES[granularity]
+    return timestamp[:length] + suffix
+
+
+def to_bucket(moment: datetime, granularity: str) -> str:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return bucket_start(moment.astimezone(timezone.utc).isoformat(), granularity)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")[:40] or "unknown"
+
+
+def failure_reason(error_message: Optional[str]) -> str:
+    """
+    Short, stable key for a failure message, safe to use as a document field name.
+
+    Twitter errors are keyed by the title of the API error body (twitter_forbidden,
+    twitter_too_many_requests, ...) so messages differing only in detail group together.
+    """
+    message = error_message or ""
+    if message.startswith(TWITTER_ERROR_PREFIX):
+        try:
+            body = json.loads(message[len(TWITTER_ERROR_PREFIX):])
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            title = body.get("title") or body.get("detail") or body.get("status")
+            if title:
+                return "twitter_" + _slug(str(title))
+        return "twitter_error"
+    if is_quota_error(message):
+        return "rate_limited"
+    if "timed out" in message.lower() or "timeout" in message.lower():
+        return "timeout"
+    return "other"
+
+
+def rollup_increments(status: str, reason: Optional[str], count: int = 1) -> dict:
+    increments = {"total": count, status: count}
+    if status == "failed":
+        increments[f"failure_reasons.{reason or 'other'}"] = count
+    return increments
+
+
+def add_counts(counts: dict, status: str, reason: Optional[str], count: int):
+    """Add `count` posts of one status (and failure reason) to a counts document"""
+    counts["total"] = counts.get("total", 0) + count
+    counts[status] = counts.get(status, 0) + count
+    if status == "failed":
+        reasons = counts.setdefault("failure_reasons", {})
+        reasons[reason or "other"] = reasons.get(reason or "other", 0) + count
+
+
+def merge_backfill(bucket: dict) -> dict:
+    """
+    Bucket counts including posts written before rollups existed.
+
+    Those are kept under `backfill`, written with $set from a full recount, apart
+    from the live $inc counters, so re-running the backfill never double counts.
+    """
+    backfill = bucket.pop("backfill", None) or {}
+    if backfill.get("success"):
+        add_counts(bucket, "success", None, backfill["success"])
+    # Every backfilled failure is counted under its reason
+    for reason, count in backfill.get("failure_reasons", {}).items():
+        add_counts(bucket, "failed", reason, count)
+    return bucket
+
+
+def backfill_pipeline(user_id: str) -> List[dict]:
+    """
+    Hourly counts per status and error message for posts written before rollups.
+
+    Messages are grouped verbatim; reasons are normalized by the caller since that
+    logic has no server-side equivalent.
+    """
+    length, suffix = GRANULARITIES["hour"]
+    return [
+        {"$match": {"user_id": user_id, "rolled_up": {"$ne": True}}},
+        {"$group": {
+            "_id": {
+                "bucket": {"$concat": [{"$substrCP": ["$created_at", 0, length]}, suffix]},
+                "status": "$status",
+                "error_message": "$error_message"
+            },
+            "count": {"$sum": 1}
+        }}
+    ]
+
+
+def summarize(buckets: Iterable[dict]) -> dict:
+    """Totals, success rate and failure reasons over rollup documents"""
+    totals = {"total": 0, "success": 0, "failed": 0, "failure_reasons": {}}
+    for bucket in buckets:
+        for field in ("total", "success", "failed"):
+            totals[field] += bucket.get(field, 0)
+        for reason, count in bucket.get("failure_reasons", {}).items():
+            totals["failure_reasons"][reason] = totals["failure_reasons"].get(reason, 0) + count
+    totals["success_rate"] = totals["success"] / totals["total"] if totals["total"] else None
+    return totals
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Production server entry point
+
+Runs server:app under uvicorn with uvloop and httptools when they are installed,
+one worker per CPU by default. HTTP/2 and TLS are expected to terminate at the
+reverse proxy in front of the workers; uvicorn speaks HTTP/1.1 with keep-alive.
+
+Environment:
+    HOST / PORT            bind address (default 0.0.0.0:8001)
+    WEB_CONCURRENCY        worker processes (default: CPU count)
+    KEEP_ALIVE_SECONDS     idle keep-alive timeout (default 5)
+    GRACEFUL_SHUTDOWN_SECONDS
+                           time uvicorn gives in-flight requests and the
+                           scheduler drain on shutdown (default 45)
+"""
+import importlib.util
+import os
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+def has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def main():
+    workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+    loop = "uvloop" if has_module("uvloop") else "asyncio"
+    http = "httptools" if has_module("httptools") else "h11"
+
+    print(f"Starting {workers} worker(s) with loop={loop} http={http}")
+
+    uvicorn.run(
+        "server:app",
+        app_dir=str(ROOT_DIR),
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8001')),
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1'),
+        timeout_keep_alive=int(os.environ.get('KEEP_ALIVE_SECONDS', '5')),
+        timeout_graceful_shutdown=int(os.environ.get('GRACEFUL_SHUTDOWN_SECONDS', '45')),
+    )
+
+
+if __name__ == "__main__":
+    main()
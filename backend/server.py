@@ -1,21 +1,25 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Response
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pydantic import ValidationError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, field_validator
+from typing import Dict, List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
 import asyncio
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from google import genai
-from google.genai import types
 from apscheduler.triggers.cron import CronTrigger
 import requests
 import hashlib
@@ -23,13 +27,55 @@ import base64
 import secrets
 import json
 from urllib.parse import urlencode
+from fingerprints import FingerprintIndex, from_bytes, minhash, to_bytes
+from pacing import AdaptivePacer, stable_jitter
+from prompts import PROMPT_TEMPLATES, LATEST_PROMPT_VERSION, LEGACY_PROMPT_VERSION, fit_tweet
+from rollups import (
+    GRANULARITIES, add_counts, backfill_pipeline, bucket_start, failure_reason, merge_backfill,
+    rollup_increments, summarize, to_bucket
+)
+from providers import build_router
+from cachetools import TTLCache
+import math
+import socket
+import time
+from collections import Counter
+from db_pool import PoolMonitor
+from rate_limit import TokenBucketLimiter, MongoTokenBucketLimiter, AdmissionController, RateLimited, Overloaded
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process scheduler lock, every process schedules
+    fcntl = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# MongoDB connection pool and timeouts (milliseconds)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '20000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+
+# Readiness: ping deadline (seconds) and how far back pool checkout failures count
+READINESS_PING_TIMEOUT = float(os.environ.get('READINESS_PING_TIMEOUT', '2'))
+READINESS_FAILURE_WINDOW = float(os.environ.get('READINESS_FAILURE_WINDOW', '30'))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+pool_monitor = PoolMonitor(MONGO_MAX_POOL_SIZE)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[pool_monitor]
+)
 db = client[os.environ['DB_NAME']]
 
 # JWT Configuration
@@ -37,6 +83,65 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-super-secret-jwt-key')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# Twitter OAuth flow configuration
+OAUTH_STATE_TTL_SECONDS = int(os.environ.get('OAUTH_STATE_TTL_SECONDS', '600'))
+OAUTH_STATE_AUDIENCE = 'twitter-oauth-state'
+
+# Scheduler configuration
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', '100'))
+
+# Each schedule posts at a stable offset inside this window after the hourly slot,
+# with dispatch concurrency adapted to provider latency and quota errors
+SCHEDULER_SPREAD_SECONDS = int(os.environ.get('SCHEDULER_SPREAD_SECONDS', '3000'))
+SCHEDULER_TICK_SECONDS = int(os.environ.get('SCHEDULER_TICK_SECONDS', '60'))
+SCHEDULER_MIN_CONCURRENCY = int(os.environ.get('SCHEDULER_MIN_CONCURRENCY', '2'))
+SCHEDULER_MAX_CONCURRENCY = int(os.environ.get('SCHEDULER_MAX_CONCURRENCY', '16'))
+SCHEDULER_TARGET_LATENCY = float(os.environ.get('SCHEDULER_TARGET_LATENCY', '10'))
+SCHEDULER_DRAIN_SECONDS = int(os.environ.get('SCHEDULER_DRAIN_SECONDS', '30'))
+SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE', '/tmp/backend-ai-scheduler.lock')
+# A slot whose run never started (e.g. the process was down at the top of the hour)
+# is still started this many seconds late; later it is left to the next slot
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.environ.get('SCHEDULER_MISFIRE_GRACE_SECONDS', '300'))
+
+# Rate limiting ("memory" per process, or "mongo" shared by all replicas) and admission control
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/minute')
+RATE_LIMIT_GENERATE = os.environ.get('RATE_LIMIT_GENERATE', '30/hour')
+MAX_IN_FLIGHT_REQUESTS = int(os.environ.get('MAX_IN_FLIGHT_REQUESTS', '500'))
+# Password hashing (~250ms of CPU) and tweet generation (a model call plus a Twitter
+# round trip, often seconds) get separate slots so slow generations never starve logins
+MAX_CONCURRENT_BCRYPT = int(os.environ.get('MAX_CONCURRENT_BCRYPT', '8'))
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get('MAX_CONCURRENT_GENERATIONS', '16'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '0.5'))
+
+# Idempotency: how long keys are remembered, and after how long an unfinished claim may be taken over
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '300'))
+
+# Tweet generation backends, tried in GENERATION_ROUTING order ("priority", "latency" or "cost")
+GENERATION_PROVIDERS = os.environ.get('GENERATION_PROVIDERS', 'gemini')
+GENERATION_ROUTING = os.environ.get('GENERATION_ROUTING', 'priority')
+GENERATION_TIMEOUT_SECONDS = float(os.environ.get('GENERATION_TIMEOUT_SECONDS', '30'))
+
+# Admin endpoints are disabled unless ADMIN_API_KEY is set
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY')
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '1000'))
+
+# Analytics: after how long an unfinished rollup backfill may be taken over
+ROLLUP_BACKFILL_LOCK_SECONDS = int(os.environ.get('ROLLUP_BACKFILL_LOCK_SECONDS', '600'))
+
+# Response compression
+GZIP_MINIMUM_SIZE = int(os.environ.get('GZIP_MINIMUM_SIZE', '1000'))
+GZIP_COMPRESS_LEVEL = int(os.environ.get('GZIP_COMPRESS_LEVEL', '6'))
+
+# Near-duplicate detection: candidates whose estimated Jaccard similarity (word bigrams)
+# to a previous post reaches this are regenerated. One inserted or swapped word in a
+# typical tweet scores 0.75-0.9; different tweets on the same topic stay under 0.15
+DUPLICATE_SIMILARITY_THRESHOLD = float(os.environ.get('DUPLICATE_SIMILARITY_THRESHOLD', '0.5'))
+DUPLICATE_MAX_RETRIES = int(os.environ.get('DUPLICATE_MAX_RETRIES', '2'))
+DUPLICATE_HISTORY_SIZE = int(os.environ.get('DUPLICATE_HISTORY_SIZE', '5000'))
+FINGERPRINT_CACHE_MB = int(os.environ.get('FINGERPRINT_CACHE_MB', '256'))
+
 # Security
 security = HTTPBearer()
 
@@ -56,6 +161,41 @@ def health():
         "message": "API is running"
     }
 
+# =======================
+# Readiness check
+# =======================
+@app.get("/ready")
+async def ready():
+    """
+    Readiness for the load balancer: Mongo answers a ping and the pool has headroom.
+    
+    Returns 503 when the ping fails or times out, every pooled connection is in use,
+    or checkouts failed recently (pool exhausted / wait queue timeouts).
+    """
+    started = time.monotonic()
+    try:
+        await asyncio.wait_for(db.command("ping"), READINESS_PING_TIMEOUT)
+        mongo_ok = True
+        mongo_error = None
+    except Exception as e:
+        mongo_ok = False
+        mongo_error = str(e) or type(e).__name__
+    ping_ms = (time.monotonic() - started) * 1000
+    
+    pool = pool_monitor.snapshot()
+    recent_failures = pool_monitor.recent_failures(READINESS_FAILURE_WINDOW)
+    saturated = pool["in_use"] >= pool["max_pool_size"] or recent_failures > 0
+    is_ready = mongo_ok and not saturated
+    
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "unavailable",
+            "mongo": {"ok": mongo_ok, "ping_ms": round(ping_ms, 2), "error": mongo_error},
+            "pool": {**pool, "recent_checkout_failures": recent_failures, "saturated": saturated}
+        }
+    )
+
 # =======================
 # Favicon fix (avoid 404)
 # =======================
@@ -70,20 +210,12 @@ api_router = APIRouter(prefix="/api")
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
 
-# Initialize Gemini client
-gemini_client = None
-
-def get_gemini_client():
-    global gemini_client
-    if gemini_client is None:
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key or api_key == 'your-gemini-api-key-here':
-            raise HTTPException(
-                status_code=500, 
-                detail="Gemini API key not configured. Please set GEMINI_API_KEY in .env file"
-            )
-        gemini_client = genai.Client(api_key=api_key)
-    return gemini_client
+# Initialize tweet generation providers (Gemini by default)
+generation_router = build_router(
+    [name.strip() for name in GENERATION_PROVIDERS.split(',') if name.strip()],
+    GENERATION_ROUTING,
+    GENERATION_TIMEOUT_SECONDS
+)
 
 # ===== Models =====
 class UserCreate(BaseModel):
@@ -107,6 +239,7 @@ class TokenResponse(BaseModel):
     user: UserResponse
 
 class TwitterAccountResponse(BaseModel):
+    id: Optional[str] = None
     twitter_id: str
     screen_name: str
     name: str
@@ -119,6 +252,14 @@ class ContentConfigCreate(BaseModel):
     length: str = "medium"
     hashtags: bool = True
     emojis: bool = False
+    prompt_version: str = LATEST_PROMPT_VERSION
+    
+    @field_validator("prompt_version")
+    @classmethod
+    def check_prompt_version(cls, value):
+        if value not in PROMPT_TEMPLATES:
+            raise ValueError(f"Unknown prompt version, expected one of {', '.join(PROMPT_TEMPLATES)}")
+        return value
 
 class ContentConfigResponse(BaseModel):
     id: str
@@ -127,6 +268,7 @@ class ContentConfigResponse(BaseModel):
     length: str
     hashtags: bool
     emojis: bool
+    prompt_version: str = LEGACY_PROMPT_VERSION
     created_at: str
     updated_at: str
 
@@ -135,6 +277,10 @@ class ScheduleCreate(BaseModel):
     time_of_day: str
     timezone: str = "UTC"
     enabled: bool = True
+    # None links the user's most recently connected account / updated config when
+    # the schedule is saved (and, without one yet, the first one added later)
+    twitter_account_id: Optional[str] = None
+    content_config_id: Optional[str] = None
 
 class ScheduleResponse(BaseModel):
     id: str
@@ -142,6 +288,8 @@ class ScheduleResponse(BaseModel):
     time_of_day: str
     timezone: str
     enabled: bool
+    twitter_account_id: Optional[str] = None
+    content_config_id: Optional[str] = None
     created_at: str
     updated_at: str
 
@@ -149,17 +297,56 @@ class PostResponse(BaseModel):
     id: str
     content: str
     twitter_id: Optional[str] = None
+    twitter_account_id: Optional[str] = None
     status: str
     error_message: Optional[str] = None
     created_at: str
     posted_at: Optional[str] = None
 
+class BulkContentConfigRow(ContentConfigCreate):
+    user_id: str
+    id: Optional[str] = None
+
+class BulkScheduleRow(ScheduleCreate):
+    user_id: str
+    id: Optional[str] = None
+
+class BulkRowResult(BaseModel):
+    row: int
+    id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+class BulkUpsertResponse(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    results: List[BulkRowResult]
+
 class StatsResponse(BaseModel):
     total_posts: int
     successful_posts: int
     failed_posts: int
     scheduled_posts: int
 
+class AnalyticsBucket(BaseModel):
+    bucket: str
+    total: int = 0
+    success: int = 0
+    failed: int = 0
+    failure_reasons: Dict[str, int] = {}
+
+class AnalyticsResponse(BaseModel):
+    granularity: str
+    start: str
+    end: str
+    total: int
+    success: int
+    failed: int
+    success_rate: Optional[float] = None
+    failure_reasons: Dict[str, int]
+    buckets: List[AnalyticsBucket]
+
 # ===== Utility Functions =====
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -193,46 +380,336 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-# ===== AI Tweet Generation =====
-async def generate_tweet(content_config: dict, user_id: str) -> str:
+# ===== Account / Config Resolution =====
+async def resolve_twitter_account(user_id: str, account_id: Optional[str] = None, projection: Optional[dict] = None) -> Optional[dict]:
+    """Return the given Twitter account of a user, or their most recently connected one"""
+    query = {"user_id": user_id}
+    if account_id:
+        query["id"] = account_id
+    return await db.twitter_accounts.find_one(query, projection or {"_id": 0}, sort=[("connected_at", -1)])
+
+async def resolve_content_config(user_id: str, config_id: Optional[str] = None, projection: Optional[dict] = None) -> Optional[dict]:
+    """Return the given content config of a user, or their most recently updated one"""
+    query = {"user_id": user_id}
+    if config_id:
+        query["id"] = config_id
+    return await db.content_configs.find_one(query, projection or {"_id": 0}, sort=[("updated_at", -1)])
+
+async def newest_ids(collection, sort_field: str, user_ids: list) -> dict:
+    """Map each user to the `id` of their newest document (by `sort_field`) in `collection`"""
+    docs = await collection.aggregate([
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$sort": {"user_id": 1, sort_field: -1}},
+        {"$group": {"_id": "$user_id", "id": {"$first": "$id"}}}
+    ]).to_list(None)
+    return {doc["_id"]: doc["id"] for doc in docs}
+
+async def link_schedules(user_id: str, link_field: str, link_id: str):
+    """Link the user's schedules saved before they had an account / config to this one"""
+    await db.schedules.update_many(
+        {"user_id": user_id, link_field: None},
+        {"$set": {link_field: link_id}}
+    )
+
+def linked_lookup(collection: str, link_field: str, as_field: str, projection: Optional[dict] = None) -> dict:
     """
-    Generate a tweet using Gemini's API.
-    
-    This function uses the Gemini SDK to generate tweets based on user's content configuration.
-    It sends a structured prompt to Gemini to create engaging, character-limited tweets.
+    Build a $lookup stage joining a schedule to the document of `collection` it links.
+
+    Schedules are linked when saved, so only the explicit id is followed; a schedule
+    whose account or config is gone (or was never set) joins nothing.
     """
-    client = get_gemini_client()
-    
-    length_map = {
-        "short": "50-100 characters",
-        "medium": "100-200 characters",
-        "long": "200-280 characters"
+    return {
+        "$lookup": {
+            "from": collection,
+            "let": {"user_id": "$user_id", "link_id": f"${link_field}"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$id", "$$link_id"]},
+                    {"$eq": ["$user_id", "$$user_id"]}
+                ]}}},
+                {"$project": projection or {"_id": 0}}
+            ],
+            "as": as_field
+        }
     }
+
+def index_specs() -> list:
+    """(collection, keys, options) for every index the app relies on"""
+    return [
+        (db.twitter_accounts, [("user_id", 1), ("connected_at", -1)], {}),
+        (db.twitter_accounts, [("user_id", 1), ("twitter_id", 1)], {"unique": True}),
+        (db.twitter_accounts, "id", {"unique": True, "sparse": True}),
+        (db.content_configs, [("user_id", 1), ("updated_at", -1)], {}),
+        (db.content_configs, "id", {"unique": True}),
+        (db.schedules, [("user_id", 1), ("updated_at", -1)], {}),
+        (db.schedules, "id", {"unique": True}),
+        (db.schedules, [("enabled", 1), ("jitter", 1)], {}),
+        (db.posts, [("user_id", 1), ("created_at", -1)], {}),
+        (db.tweet_fingerprints, [("user_id", 1), ("created_at", -1)], {}),
+        (db.twitter_temp_tokens, "user_id", {"unique": True}),
+        (db.twitter_temp_tokens, "created_at", {"expireAfterSeconds": OAUTH_STATE_TTL_SECONDS}),
+        (db.rate_limits, "updated_at", {"expireAfterSeconds": 86400}),
+        (db.idempotency_keys, "key", {"unique": True}),
+        (db.idempotency_keys, "created_at", {"expireAfterSeconds": IDEMPOTENCY_TTL_HOURS * 3600}),
+        (db.post_rollups, [("user_id", 1), ("granularity", 1), ("bucket", 1)], {"unique": True}),
+        (db.post_rollup_backfills, "user_id", {"unique": True}),
+        (db.scheduler_runs, "id", {"unique": True}),
+        (db.scheduler_runs, [("slot", 1), ("status", 1)], {}),
+        (db.scheduler_runs, "started_at", {"expireAfterSeconds": 30 * 86400}),
+    ]
+
+async def ensure_indexes():
+    """
+    Create the indexes backing per-user lookups, the scheduler join and TTL cleanup.
     
-    prompt = f"""You are an expert social media content creator. Generate an engaging tweet that is exactly within Twitter's 280 character limit.
+    Each index is created on its own so one failure does not leave the rest missing.
+    Failures are logged; a missing unique index raises, since idempotency keys, rate
+    limit buckets and upserts rely on DuplicateKeyError for correctness.
+    """
+    missing_unique = []
+    for collection, keys, options in index_specs():
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            logging.error(f"Failed to create index {keys} on {collection.name}: {e}")
+            if options.get("unique"):
+                missing_unique.append(f"{collection.name}.{keys}")
+    if missing_unique:
+        raise RuntimeError(f"Unique indexes could not be created: {', '.join(missing_unique)}")
 
-Generate a tweet about: {content_config['topic']}
+async def backfill_twitter_account_ids():
+    """
+    Give Twitter accounts connected before multi-account support their `id`.
+    
+    Those accounts date from one account per user, so the user's posts without a
+    `twitter_account_id` were posted from them and are linked as well. The id is
+    derived from the document's _id so workers backfilling at once agree on it.
+    """
+    cursor = db.twitter_accounts.find({"id": {"$exists": False}}, {"_id": 1, "user_id": 1})
+    account_updates = []
+    post_updates = []
+    
+    async def write():
+        await db.twitter_accounts.bulk_write(account_updates, ordered=False)
+        await db.posts.bulk_write(post_updates, ordered=False)
+    
+    async for account in cursor:
+        account_id = str(uuid.uuid5(uuid.NAMESPACE_OID, str(account["_id"])))
+        account_updates.append(UpdateOne({"_id": account["_id"], "id": {"$exists": False}}, {"$set": {"id": account_id}}))
+        post_updates.append(UpdateMany(
+            {"user_id": account["user_id"], "twitter_account_id": None},
+            {"$set": {"twitter_account_id": account_id}}
+        ))
+        if len(account_updates) >= 1000:
+            await write()
+            account_updates, post_updates = [], []
+    if account_updates:
+        await write()
 
-Tone: {content_config['tone']}
-Length: {length_map.get(content_config['length'], 'medium')}
-Include hashtags: {'Yes' if content_config.get('hashtags') else 'No'}
-Include emojis: {'Yes' if content_config.get('emojis') else 'No'}
+async def backfill_schedule_links():
+    """
+    Link schedules saved without an explicit account or config.
 
-Rules:
-1. Must be under 280 characters
-2. Be engaging and authentic
-3. No quotes around the tweet
-4. Just return the tweet text, nothing else"""
+    They used to follow the user's newest account and config at every run; pinning
+    them to what they resolve to today stops a newly connected account or an edited
+    config from silently taking them over.
+    """
+    cursor = db.schedules.find(
+        {"$or": [{"twitter_account_id": None}, {"content_config_id": None}]},
+        {"_id": 1, "user_id": 1, "twitter_account_id": 1, "content_config_id": 1}
+    )
+    
+    async def write(batch):
+        user_ids = list({schedule["user_id"] for schedule in batch})
+        accounts = await newest_ids(db.twitter_accounts, "connected_at", user_ids)
+        configs = await newest_ids(db.content_configs, "updated_at", user_ids)
+        requests_batch = []
+        for schedule in batch:
+            links = {}
+            if not schedule.get("twitter_account_id") and schedule["user_id"] in accounts:
+                links["twitter_account_id"] = accounts[schedule["user_id"]]
+            if not schedule.get("content_config_id") and schedule["user_id"] in configs:
+                links["content_config_id"] = configs[schedule["user_id"]]
+            if links:
+                requests_batch.append(UpdateOne({"_id": schedule["_id"]}, {"$set": links}))
+        if requests_batch:
+            await db.schedules.bulk_write(requests_batch, ordered=False)
     
+    batch = []
+    async for schedule in cursor:
+        batch.append(schedule)
+        if len(batch) >= 1000:
+            await write(batch)
+            batch = []
+    if batch:
+        await write(batch)
+
+async def backfill_schedule_jitter():
+    """Give schedules created before send-time spreading their stable jitter"""
+    cursor = db.schedules.find({"jitter": {"$exists": False}}, {"_id": 1, "id": 1})
+    requests_batch = []
+    async for schedule in cursor:
+        requests_batch.append(UpdateOne({"_id": schedule["_id"]}, {"$set": {"jitter": stable_jitter(schedule["id"])}}))
+        if len(requests_batch) >= 1000:
+            await db.schedules.bulk_write(requests_batch, ordered=False)
+            requests_batch = []
+    if requests_batch:
+        await db.schedules.bulk_write(requests_batch, ordered=False)
+
+# ===== Tweet Fingerprints =====
+async def load_fingerprints(user_id: str, limit: int) -> list:
+    docs = await db.tweet_fingerprints.find(
+        {"user_id": user_id, "minhash": {"$exists": True}},
+        {"_id": 0, "minhash": 1}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    return [from_bytes(doc["minhash"]) for doc in docs]
+
+fingerprint_index = FingerprintIndex(
+    load_fingerprints,
+    history=DUPLICATE_HISTORY_SIZE,
+    max_bytes=FINGERPRINT_CACHE_MB * 1024 * 1024
+)
+
+async def record_fingerprint(user_id: str, post_id: str, tweet_text: str):
+    """Remember a posted tweet so later candidates can be checked against it"""
+    fingerprint = minhash(tweet_text)
     try:
-        # Call Gemini API using the new google.genai package
-        response = await asyncio.to_thread(
-            client.models.generate_content,
-            model='gemini-2.5-flash',
-            contents=prompt
-        )
+        await db.tweet_fingerprints.insert_one({
+            "user_id": user_id,
+            "post_id": post_id,
+            "minhash": to_bytes(fingerprint),
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+    except Exception as e:
+        # The tweet is already out; a missing fingerprint only weakens duplicate checks
+        logging.error(f"Failed to store fingerprint for post {post_id}: {e}")
+        return
+    fingerprint_index.add(user_id, fingerprint)
+
+async def backfill_fingerprints():
+    """Compute MinHash signatures for fingerprints stored as SimHash, from the posted text"""
+    cursor = db.tweet_fingerprints.find({"minhash": {"$exists": False}}, {"_id": 1, "post_id": 1})
+    batch = []
+    
+    async def write(batch):
+        posts = await db.posts.find(
+            {"id": {"$in": [doc["post_id"] for doc in batch]}},
+            {"_id": 0, "id": 1, "content": 1}
+        ).to_list(None)
+        contents = {post["id"]: post["content"] for post in posts}
+        requests_batch = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"minhash": to_bytes(minhash(contents[doc["post_id"]]))}})
+            for doc in batch if doc["post_id"] in contents
+        ]
+        if requests_batch:
+            await db.tweet_fingerprints.bulk_write(requests_batch, ordered=False)
+    
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= 1000:
+            await write(batch)
+            batch = []
+    if batch:
+        await write(batch)
+
+# ===== Rate Limiting & Admission Control =====
+def make_limiter(rate: str):
+    if RATE_LIMIT_BACKEND == 'mongo':
+        return MongoTokenBucketLimiter(db.rate_limits, rate)
+    return TokenBucketLimiter(rate)
+
+login_limiter = make_limiter(RATE_LIMIT_LOGIN)
+generate_limiter = make_limiter(RATE_LIMIT_GENERATE)
+
+# Bcrypt and Gemini/Twitter calls run in the thread pool; cap them below its size
+bcrypt_admission = AdmissionController(MAX_CONCURRENT_BCRYPT, ADMISSION_QUEUE_TIMEOUT)
+generation_admission = AdmissionController(MAX_CONCURRENT_GENERATIONS, ADMISSION_QUEUE_TIMEOUT)
+# Every request, so a burst is shed before it piles up on the event loop
+request_admission = AdmissionController(MAX_IN_FLIGHT_REQUESTS)
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+async def enforce_rate_limit(limiter, *keys: str):
+    for key in keys:
+        try:
+            await limiter.hit(key)
+        except RateLimited as e:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+
+async def limit_login(request: Request, credentials: UserLogin):
+    await enforce_rate_limit(login_limiter, f"login:ip:{client_ip(request)}", f"login:email:{credentials.email.lower()}")
+
+async def limit_generate(request: Request, current_user: dict = Depends(get_current_user)):
+    await enforce_rate_limit(generate_limiter, f"generate:user:{current_user['id']}", f"generate:ip:{client_ip(request)}")
+
+def admission_dependency(controller: AdmissionController):
+    """Dependency holding one of `controller`'s slots for the duration of the request"""
+    async def admit():
+        try:
+            async with controller.admit():
+                yield
+        except Overloaded:
+            raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    return admit
+
+admit_bcrypt = admission_dependency(bcrypt_admission)
+admit_generation = admission_dependency(generation_admission)
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "admission": {
+            "requests": request_admission.snapshot(),
+            "bcrypt": bcrypt_admission.snapshot(),
+            "generation": generation_admission.snapshot()
+        },
+        "rate_limits": {
+            "login": dict(login_limiter.stats),
+            "generate": dict(generate_limiter.stats)
+        },
+        "scheduler": {**scheduler_pacer.snapshot(), "runs": dict(scheduler_run_stats)},
+        "providers": generation_router.snapshot(),
+        "mongo_pool": pool_monitor.snapshot()
+    }
+
+# ===== AI Tweet Generation =====
+async def generate_tweet(content_config: dict, user_id: str) -> str:
+    """
+    Generate a tweet that is not a near-duplicate of anything the user posted before.
+    
+    Candidates too similar to a previous post are regenerated, telling the model
+    which text to steer away from, up to DUPLICATE_MAX_RETRIES times.
+    """
+    avoid = None
+    for attempt in range(DUPLICATE_MAX_RETRIES + 1):
+        tweet = await generate_tweet_candidate(content_config, avoid)
+        
+        similarity = await fingerprint_index.most_similar(user_id, tweet)
+        if similarity is None or similarity < DUPLICATE_SIMILARITY_THRESHOLD:
+            return tweet
         
-        tweet = response.text.strip()
+        logging.info(f"Near-duplicate tweet for user {user_id} (similarity {similarity:.2f}), regenerating")
+        avoid = tweet
+    
+    raise HTTPException(
+        status_code=409,
+        detail="Failed to generate a tweet that differs from previous posts"
+    )
+
+async def generate_tweet_candidate(content_config: dict, avoid: Optional[str] = None) -> str:
+    """
+    Generate a tweet with the first generation provider that succeeds.
+    
+    Providers return raw model text; cleanup and length fitting happen here so every
+    backend produces tweets that are ready to post.
+    """
+    try:
+        tweet = (await generation_router.generate(content_config, avoid)).strip()
         
         # Remove any quotes that might wrap the tweet
         if tweet.startswith('"') and tweet.endswith('"'):
@@ -240,14 +717,15 @@ Rules:
         if tweet.startswith("'") and tweet.endswith("'"):
             tweet = tweet[1:-1]
         
-        # Ensure tweet is within character limit
-        if len(tweet) > 280:
-            tweet = tweet[:277] + "..."
+        # Ensure tweet is within Twitter's weighted character limit
+        tweet = fit_tweet(tweet)
         
         return tweet
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Gemini API error: {str(e)}")
+        logging.error(f"Tweet generation error: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate tweet: {str(e)}"
@@ -265,6 +743,32 @@ def generate_pkce_pair():
     
     return code_verifier, code_challenge
 
+def create_oauth_state(user_id: str) -> str:
+    """Signed, self-contained OAuth state linking the callback to the user"""
+    payload = {
+        "user_id": user_id,
+        "nonce": secrets.token_urlsafe(16),
+        "aud": OAUTH_STATE_AUDIENCE,
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=OAUTH_STATE_TTL_SECONDS)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+def decode_oauth_state(state: str) -> dict:
+    """Validate an OAuth state without touching the database; raises jwt.InvalidTokenError"""
+    return jwt.decode(state, JWT_SECRET, algorithms=[JWT_ALGORITHM], audience=OAUTH_STATE_AUDIENCE)
+
+async def pop_code_verifier(user_id: str, state: str) -> Optional[str]:
+    """
+    Consume the PKCE verifier stored for this exact state, so each state is single-use.
+    
+    Starting a new flow replaces the user's record, which invalidates older states.
+    """
+    temp_token = await db.twitter_temp_tokens.find_one_and_delete(
+        {"user_id": user_id, "state": state},
+        {"_id": 0, "code_verifier": 1}
+    )
+    return temp_token.get('code_verifier') if temp_token else None
+
 # ===== Twitter API Functions =====
 def post_tweet_to_twitter(access_token: str, tweet_text: str) -> dict:
     """Post tweet using OAuth 2.0 Bearer token"""
@@ -283,71 +787,540 @@ def post_tweet_to_twitter(access_token: str, tweet_text: str) -> dict:
     else:
         raise Exception(f"Twitter API error: {response.text}")
 
-# ===== Scheduled Job Function =====
-async def process_scheduled_posts():
+# ===== Post Analytics =====
+def rollup_updates(user_id: str, created_at: str, post_status: str, reason: Optional[str], count: int = 1) -> List[UpdateOne]:
+    """$inc upserts for the hourly and daily buckets a post falls in"""
+    increments = rollup_increments(post_status, reason, count)
+    return [
+        UpdateOne(
+            {"user_id": user_id, "granularity": granularity, "bucket": bucket_start(created_at, granularity)},
+            {"$inc": increments},
+            upsert=True
+        )
+        for granularity in GRANULARITIES
+    ]
+
+async def record_post_rollup(post_doc: dict):
+    """Count a written post in its user's rollups; analytics must never fail a publish"""
+    reason = failure_reason(post_doc["error_message"]) if post_doc["status"] == "failed" else None
     try:
-        schedules = await db.schedules.find({"enabled": True}, {"_id": 0}).to_list(None)
-        
-        for schedule in schedules:
-            user_id = schedule['user_id']
-            
-            twitter_account = await db.twitter_accounts.find_one({"user_id": user_id}, {"_id": 0})
-            if not twitter_account:
-                continue
-            
-            content_config = await db.content_configs.find_one({"user_id": user_id}, {"_id": 0})
-            if not content_config:
+        await db.post_rollups.bulk_write(
+            rollup_updates(post_doc["user_id"], post_doc["created_at"], post_doc["status"], reason),
+            ordered=False
+        )
+    except Exception as e:
+        logging.error(f"Error updating post rollups for {post_doc['id']}: {str(e)}")
+
+rollup_backfilled_users = TTLCache(maxsize=10000, ttl=3600)
+
+async def backfill_post_rollups(user_id: str):
+    """
+    Fold a user's posts written before rollups existed into the rollups, once.
+    
+    A $group pipeline recounts all of the user's unflagged posts (the set no longer
+    changes: new posts are written flagged), and each bucket's `backfill` counts
+    are $set from that recount. Re-running after a partial failure rewrites the same
+    values, so nothing is counted twice. One request per user runs it; a claim left
+    by a crashed run is taken over after a while.
+    """
+    if user_id in rollup_backfilled_users:
+        return
+    
+    now = datetime.now(timezone.utc)
+    try:
+        await db.post_rollup_backfills.insert_one({"user_id": user_id, "status": "running", "started_at": now})
+    except DuplicateKeyError:
+        marker = await db.post_rollup_backfills.find_one_and_update(
+            {"user_id": user_id, "status": "running", "started_at": {"$lt": now - timedelta(seconds=ROLLUP_BACKFILL_LOCK_SECONDS)}},
+            {"$set": {"started_at": now}}
+        )
+        if not marker:
+            # Already done, or another request is running it
+            if await db.post_rollup_backfills.count_documents({"user_id": user_id, "status": "done"}):
+                rollup_backfilled_users[user_id] = True
+            return
+    
+    try:
+        counts = {}
+        async for group in db.posts.aggregate(backfill_pipeline(user_id)):
+            key = group["_id"]
+            if key.get("status") not in ("success", "failed") or not key.get("bucket"):
                 continue
+            reason = failure_reason(key.get("error_message")) if key["status"] == "failed" else None
+            for granularity in GRANULARITIES:
+                bucket = counts.setdefault((granularity, bucket_start(key["bucket"], granularity)), {})
+                add_counts(bucket, key["status"], reason, group["count"])
+        
+        requests_batch = [
+            UpdateOne(
+                {"user_id": user_id, "granularity": granularity, "bucket": bucket},
+                {"$set": {"backfill": bucket_counts}},
+                upsert=True
+            )
+            for (granularity, bucket), bucket_counts in counts.items()
+        ]
+        for i in range(0, len(requests_batch), BULK_BATCH_SIZE):
+            await db.post_rollups.bulk_write(requests_batch[i:i + BULK_BATCH_SIZE], ordered=False)
+        
+        await db.post_rollup_backfills.update_one(
+            {"user_id": user_id},
+            {"$set": {"status": "done", "finished_at": datetime.now(timezone.utc)}}
+        )
+        rollup_backfilled_users[user_id] = True
+    except Exception as e:
+        logging.error(f"Error backfilling post rollups for user {user_id}: {str(e)}")
+        await db.post_rollup_backfills.delete_one({"user_id": user_id, "status": "running"})
+
+def parse_range_bound(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+# ===== Publishing =====
+async def publish_tweet(user_id: str, twitter_account: dict, content_config: dict) -> dict:
+    """
+    Generate a tweet, post it and record the outcome in `posts`.
+    
+    Returns the stored post document, with status "failed" if Twitter rejected it.
+    Generation errors are raised to the caller.
+    """
+    tweet_text = await generate_tweet(content_config, user_id)
+    return await post_generated_tweet(user_id, twitter_account, tweet_text)
+
+async def post_generated_tweet(user_id: str, twitter_account: dict, tweet_text: str) -> dict:
+    """Post an already generated tweet and record the outcome in `posts`"""
+    try:
+        twitter_response = await asyncio.to_thread(
+            post_tweet_to_twitter,
+            twitter_account['access_token'],
+            tweet_text
+        )
+        
+        post_doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "content": tweet_text,
+            "twitter_id": twitter_response['data']['id'],
+            "twitter_account_id": twitter_account.get('id'),
+            "status": "success",
+            "error_message": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "posted_at": datetime.now(timezone.utc).isoformat(),
+            "rolled_up": True
+        }
+        await db.posts.insert_one(post_doc)
+        await record_fingerprint(user_id, post_doc["id"], tweet_text)
+        
+    except Exception as twitter_error:
+        post_doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "content": tweet_text,
+            "twitter_id": None,
+            "twitter_account_id": twitter_account.get('id'),
+            "status": "failed",
+            "error_message": str(twitter_error),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "posted_at": None,
+            "rolled_up": True
+        }
+        await db.posts.insert_one(post_doc)
+    
+    await record_post_rollup(post_doc)
+    post_doc.pop("_id", None)
+    return post_doc
+
+# ===== Idempotency =====
+async def claim_idempotency_key(key: str, user_id: str) -> Optional[dict]:
+    """
+    Claim `key` for the current request.
+    
+    Returns None when the caller now owns the key and should do the work, otherwise
+    the existing record: completed ones carry the stored `response`.
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        await db.idempotency_keys.insert_one({
+            "key": key,
+            "user_id": user_id,
+            "status": "in_progress",
+            "response": None,
+            "created_at": now
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+    
+    # Take over claims whose owner died without completing or releasing them
+    stale = await db.idempotency_keys.find_one_and_update(
+        {"key": key, "status": "in_progress", "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}},
+        {"$set": {"created_at": now}}
+    )
+    if stale:
+        return None
+    
+    existing = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+    return existing or {"key": key, "status": "in_progress", "response": None}
+
+async def complete_idempotency_key(key: str, response: dict):
+    await db.idempotency_keys.update_one(
+        {"key": key},
+        {"$set": {"status": "completed", "response": response}}
+    )
+
+async def release_idempotency_key(key: str):
+    """Forget a claim whose work failed, so a retry can run it again"""
+    await db.idempotency_keys.delete_one({"key": key, "status": "in_progress"})
+
+def scheduled_slot_key(schedule: dict, slot: datetime) -> str:
+    """Deterministic key for one schedule's post in one scheduler slot"""
+    return f"scheduled:{schedule['user_id']}:{schedule['id']}:{slot.isoformat()}"
+
+# ===== Scheduled Post Dispatch =====
+scheduler_pacer = AdaptivePacer(
+    SCHEDULER_MIN_CONCURRENCY,
+    SCHEDULER_MAX_CONCURRENCY,
+    SCHEDULER_TARGET_LATENCY
+)
+
+def scheduled_posts_pipeline(jitter_from: float, jitter_to: float) -> list:
+    # The join and the "has account and config" filter run on the server ($unwind
+    # drops schedules whose lookup came back empty), and only the fields needed for
+    # posting travel over the wire. Sorting on the (enabled, jitter) index keeps
+    # schedules in send-time order without an in-memory sort.
+    return [
+        {"$match": {"enabled": True, "jitter": {"$gte": jitter_from, "$lt": jitter_to}}},
+        {"$sort": {"jitter": 1}},
+        {"$project": {"_id": 0, "id": 1, "user_id": 1, "jitter": 1, "twitter_account_id": 1, "content_config_id": 1}},
+        linked_lookup(
+            "twitter_accounts", "twitter_account_id", "twitter_account",
+            {"_id": 0, "id": 1, "access_token": 1}
+        ),
+        {"$unwind": "$twitter_account"},
+        linked_lookup(
+            "content_configs", "content_config_id", "content_config",
+            {"_id": 0, "user_id": 0, "created_at": 0}
+        ),
+        {"$unwind": "$content_config"}
+    ]
+
+# Set on shutdown: runs stop dispatching and checkpoint where they are
+scheduler_stopping = asyncio.Event()
+
+async def sleep_until(when: datetime) -> bool:
+    """Sleep until `when`; returns False right away once the scheduler is stopping"""
+    delay = (when - datetime.now(timezone.utc)).total_seconds()
+    if delay > 0 and not scheduler_stopping.is_set():
+        try:
+            await asyncio.wait_for(scheduler_stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+    return not scheduler_stopping.is_set()
+
+# Scheduled posts in flight, and the tweets among them already being sent (shielded
+# from cancellation); both are drained on shutdown
+scheduled_post_tasks = set()
+publishing_tasks = set()
+
+async def send_scheduled_tweet(schedule: dict, key: str, tweet_text: str) -> dict:
+    post_doc = await post_generated_tweet(schedule['user_id'], schedule['twitter_account'], tweet_text)
+    await complete_idempotency_key(key, {"post_id": post_doc["id"], "status": post_doc["status"]})
+    return post_doc
+
+async def process_schedule(schedule: dict, key: str, started: float):
+    """
+    Publish one schedule's post for the slot and report the outcome to the pacer.
+    
+    Cancelled while still generating, the claim is released so a resumed run posts
+    it. Once sending has started it finishes (post, record, complete the key) even if
+    this task is cancelled, so the tweet is neither lost nor sent twice.
+    """
+    user_id = schedule['user_id']
+    error = None
+    sending = None
+    try:
+        tweet_text = await generate_tweet(schedule['content_config'], user_id)
+        sending = asyncio.create_task(send_scheduled_tweet(schedule, key, tweet_text))
+        publishing_tasks.add(sending)
+        sending.add_done_callback(publishing_tasks.discard)
+        post_doc = await asyncio.shield(sending)
+        error = post_doc["error_message"]
+    except asyncio.CancelledError:
+        if sending is None:
+            await release_idempotency_key(key)
+        raise
+    except Exception as gen_error:
+        logging.error(f"Tweet generation error for user {user_id}: {gen_error}")
+        error = str(gen_error)
+        await release_idempotency_key(key)
+    finally:
+        await scheduler_pacer.release(started, error)
+
+# ===== Scheduler Run State =====
+SCHEDULER_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+scheduler_run_stats = Counter()
+
+def current_slot() -> datetime:
+    return datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+async def start_scheduler_run(slot: datetime, resume_from: float) -> str:
+    run_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    try:
+        await db.scheduler_runs.insert_one({
+            "id": run_id,
+            "slot": slot,
+            "owner": SCHEDULER_OWNER,
+            "status": "running",
+            "resumed_from": resume_from,
+            "checkpoint": resume_from,
+            "dispatched": 0,
+            "started_at": now,
+            "updated_at": now
+        })
+    except Exception as e:
+        logging.error(f"Error recording scheduler run: {e}")
+    return run_id
+
+async def save_scheduler_run(run_id: str, checkpoint: float, dispatched: int, run_status: str = "running"):
+    """
+    Record progress; doubles as the run's heartbeat.
+    
+    Every schedule with a jitter below `checkpoint` has been posted for the slot (or
+    was already claimed), so a resumed run starts from there.
+    """
+    update = {"checkpoint": checkpoint, "dispatched": dispatched, "status": run_status, "updated_at": datetime.now(timezone.utc)}
+    if run_status != "running":
+        update["finished_at"] = update["updated_at"]
+    try:
+        await db.scheduler_runs.update_one({"id": run_id}, {"$set": update})
+    except Exception as e:
+        logging.error(f"Error saving scheduler run checkpoint: {e}")
+
+async def find_resumable_slot() -> Optional[float]:
+    """
+    Where this hour's run should restart after a deploy or crash, or None.
+    
+    Interrupted runs and runs whose heartbeat stopped resume from the lowest
+    checkpoint; a slot with no run at all is started if still within the misfire
+    grace. Unfinished runs of earlier slots are abandoned, not replayed late.
+    """
+    slot = current_slot()
+    now = datetime.now(timezone.utc)
+    unfinished = {"$or": [
+        {"status": "interrupted"},
+        {"status": "running", "updated_at": {"$lt": now - timedelta(seconds=3 * SCHEDULER_TICK_SECONDS)}}
+    ]}
+    
+    abandoned = await db.scheduler_runs.update_many(
+        {"slot": {"$lt": slot}, **unfinished},
+        {"$set": {"status": "abandoned", "finished_at": now}}
+    )
+    if abandoned.modified_count:
+        logging.warning(f"Abandoned {abandoned.modified_count} unfinished scheduler run(s) of earlier slots")
+    
+    runs = await db.scheduler_runs.find({"slot": slot, **unfinished}, {"_id": 0, "id": 1, "checkpoint": 1}).to_list(None)
+    if runs:
+        await db.scheduler_runs.update_many(
+            {"id": {"$in": [run["id"] for run in runs]}},
+            {"$set": {"status": "resumed", "finished_at": now}}
+        )
+        return min(run.get("checkpoint") or 0.0 for run in runs)
+    
+    if (now - slot).total_seconds() <= SCHEDULER_MISFIRE_GRACE_SECONDS:
+        if not await db.scheduler_runs.count_documents({"slot": slot}):
+            return 0.0
+    return None
+
+def on_scheduler_job_skipped(event):
+    """Make skipped runs visible instead of only logged by APScheduler"""
+    reason = "overlapping" if event.code == EVENT_JOB_MAX_INSTANCES else "missed"
+    scheduler_run_stats[f"skipped_{reason}"] += 1
+    run_times = getattr(event, "scheduled_run_times", None) or [getattr(event, "scheduled_run_time", None)]
+    logging.warning(f"Scheduled posts run skipped ({reason}) for {', '.join(str(run_time) for run_time in run_times)}")
+
+# ===== Scheduled Job Function =====
+async def process_scheduled_posts(slot: Optional[datetime] = None, resume_from: float = 0.0):
+    """
+    Post for every enabled schedule once in this slot.
+    
+    Schedules are fetched one tick of the spread window at a time (short-lived cursors
+    over a jitter range), each is dispatched at its own offset, and the pacer bounds
+    how many are generating and posting at once.
+    
+    Progress is checkpointed in `scheduler_runs` every tick by a heartbeat that keeps
+    going while dispatch waits on the pacer, so a throttled run is never mistaken for
+    a dead one and resumed by another replica. On shutdown the run stops
+    dispatching and records where it got to ("interrupted") for the next start to
+    resume; a run still dispatching shortly before the next slot stops there
+    ("overrun") so slow runs never pile up.
+    """
+    # Slot the run belongs to; overlapping or repeated runs for it share idempotency keys
+    slot = slot or current_slot()
+    ticks = max(1, math.ceil(SCHEDULER_SPREAD_SECONDS / SCHEDULER_TICK_SECONDS))
+    
+    # Schedules without a jitter never match a tick; older workers still write them
+    # during a rolling deploy, so they are backfilled before every run
+    try:
+        await backfill_schedule_jitter()
+    except Exception as e:
+        logging.error(f"Schedule jitter backfill failed: {e}")
+
+    dispatch_deadline = slot + timedelta(hours=1) - timedelta(seconds=SCHEDULER_DRAIN_SECONDS)
+    run_id = await start_scheduler_run(slot, resume_from)
+    
+    # Jitter of every dispatched schedule still running, and of those cancelled before sending
+    pending = {}
+    cancelled = []
+    dispatched = 0
+    dispatched_through = resume_from
+    
+    def settle():
+        for task in [task for task in pending if task.done()]:
+            jitter = pending.pop(task)
+            if task.cancelled():
+                cancelled.append(jitter)
+    
+    def checkpoint() -> float:
+        settle()
+        return min([*pending.values(), *cancelled, dispatched_through])
+    
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+            await save_scheduler_run(run_id, checkpoint(), dispatched)
+    
+    async def stop_heartbeat():
+        # Stopped before the final save so a late heartbeat cannot overwrite its status
+        heartbeat_task.cancel()
+        await asyncio.gather(heartbeat_task, return_exceptions=True)
+    
+    heartbeat_task = asyncio.create_task(heartbeat())
+    run_status = "completed"
+    try:
+        for tick in range(min(ticks - 1, int(resume_from * ticks)), ticks):
+            jitter_from, jitter_to = max(resume_from, tick / ticks), (tick + 1) / ticks
+            if not await sleep_until(slot + timedelta(seconds=jitter_from * SCHEDULER_SPREAD_SECONDS)):
+                run_status = "interrupted"
+                break
             
-            try:
-                tweet_text = await generate_tweet(content_config, user_id)
+            cursor = db.schedules.aggregate(
+                scheduled_posts_pipeline(jitter_from, jitter_to),
+                batchSize=SCHEDULER_BATCH_SIZE
+            )
+            async for schedule in cursor:
+                if not await sleep_until(slot + timedelta(seconds=schedule['jitter'] * SCHEDULER_SPREAD_SECONDS)):
+                    run_status = "interrupted"
+                    break
+                
+                # The slot is claimed only once the pacer lets it go out, so a claim is
+                # never held (and taken over as stale) while dispatch is throttled
+                started = await scheduler_pacer.acquire()
+                if scheduler_stopping.is_set() or datetime.now(timezone.utc) >= dispatch_deadline:
+                    await scheduler_pacer.cancel()
+                    run_status = "interrupted" if scheduler_stopping.is_set() else "overrun"
+                    break
                 
+                key = scheduled_slot_key(schedule, slot)
+                dispatched_through = schedule['jitter']
                 try:
-                    twitter_response = post_tweet_to_twitter(
-                        twitter_account['access_token'],
-                        tweet_text
-                    )
-                    
-                    post_doc = {
-                        "id": str(uuid.uuid4()),
-                        "user_id": user_id,
-                        "content": tweet_text,
-                        "twitter_id": twitter_response['data']['id'],
-                        "status": "success",
-                        "error_message": None,
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "posted_at": datetime.now(timezone.utc).isoformat()
-                    }
-                    await db.posts.insert_one(post_doc)
-                    
-                except Exception as twitter_error:
-                    post_doc = {
-                        "id": str(uuid.uuid4()),
-                        "user_id": user_id,
-                        "content": tweet_text,
-                        "twitter_id": None,
-                        "status": "failed",
-                        "error_message": str(twitter_error),
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "posted_at": None
-                    }
-                    await db.posts.insert_one(post_doc)
-                    
-            except Exception as gen_error:
-                logging.error(f"Tweet generation error for user {user_id}: {gen_error}")
+                    existing = await claim_idempotency_key(key, schedule['user_id'])
+                except BaseException:
+                    await scheduler_pacer.cancel()
+                    raise
+                if existing:
+                    await scheduler_pacer.cancel()
+                    continue
                 
+                task = asyncio.create_task(process_schedule(schedule, key, started))
+                pending[task] = schedule['jitter']
+                scheduled_post_tasks.add(task)
+                task.add_done_callback(scheduled_post_tasks.discard)
+                dispatched += 1
+            else:
+                dispatched_through = jitter_to
+                continue
+            break
+        
+        if run_status == "overrun":
+            scheduler_run_stats["overruns"] += 1
+            logging.error(f"Scheduled posts run for {slot.isoformat()} overran its slot; remaining schedules wait for the next slot")
+        elif run_status == "interrupted":
+            scheduler_run_stats["interrupted"] += 1
+        
+        # Posts already dispatched finish (shutdown cancels them at the drain deadline);
+        # an overrun run leaves them running so the next slot's run can start on time
+        settle()
+        if pending:
+            timeout = None
+            if run_status == "overrun":
+                timeout = max(0.0, (slot + timedelta(hours=1) - datetime.now(timezone.utc)).total_seconds() - 1)
+            await asyncio.wait(list(pending), timeout=timeout)
+        
+        if run_status == "completed":
+            scheduler_run_stats["completed"] += 1
+        await stop_heartbeat()
+        await save_scheduler_run(run_id, checkpoint() if run_status != "completed" else 1.0, dispatched, run_status)
+                
+    except asyncio.CancelledError:
+        for task in list(pending):
+            task.cancel()
+        if pending:
+            await asyncio.wait(list(pending))
+        if run_status != "interrupted":
+            scheduler_run_stats["interrupted"] += 1
+        await stop_heartbeat()
+        await save_scheduler_run(run_id, checkpoint(), dispatched, "interrupted")
+        raise
     except Exception as e:
         logging.error(f"Scheduled post processing error: {e}")
+        await stop_heartbeat()
+        await save_scheduler_run(run_id, checkpoint(), dispatched, "interrupted")
+
+# Scheduler runs currently in flight in this process, awaited on shutdown
+active_scheduler_runs = set()
+
+async def run_scheduled_posts(slot: Optional[datetime] = None, resume_from: float = 0.0):
+    """Scheduler job entry point; tracks the run so shutdown can drain it"""
+    task = asyncio.current_task()
+    active_scheduler_runs.add(task)
+    try:
+        await process_scheduled_posts(slot, resume_from)
+    finally:
+        active_scheduler_runs.discard(task)
+
+def acquire_scheduler_lock():
+    """
+    Make sure only one worker process on this host runs the scheduler.
+    
+    Returns the open lock file (keep it referenced for the life of the process),
+    None if another worker already holds the lock, or True where flock is unavailable.
+    """
+    if fcntl is None:
+        return True
+    lock_file = open(SCHEDULER_LOCK_FILE, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+scheduler_lock = None
 
 # ===== Auth Routes =====
-@api_router.post("/auth/signup", response_model=TokenResponse)
+@api_router.post("/auth/signup", response_model=TokenResponse, dependencies=[Depends(admit_bcrypt)])
 async def signup(user_data: UserCreate):
     existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 0})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_id = str(uuid.uuid4())
-    hashed_pw = hash_password(user_data.password)
+    hashed_pw = await asyncio.to_thread(hash_password, user_data.password)
     
     user_doc = {
         "id": user_id,
@@ -369,10 +1342,10 @@ async def signup(user_data: UserCreate):
     
     return TokenResponse(access_token=token, user=user_response)
 
-@api_router.post("/auth/login", response_model=TokenResponse)
+@api_router.post("/auth/login", response_model=TokenResponse, dependencies=[Depends(limit_login), Depends(admit_bcrypt)])
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await asyncio.to_thread(verify_password, credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_jwt_token(user["id"], user["email"])
@@ -410,21 +1383,19 @@ async def get_twitter_auth_url(current_user: dict = Depends(get_current_user)):
         # Generate PKCE code verifier and challenge
         code_verifier, code_challenge = generate_pkce_pair()
         
-        # Generate random state with user_id encoded (for linking callback to user)
-        state_data = {
-            "user_id": current_user["id"],
-            "random": secrets.token_urlsafe(16)
-        }
-        state = base64.urlsafe_b64encode(json.dumps(state_data).encode()).decode()
-        
-        # Store PKCE verifier and state for this user
-        await db.twitter_temp_tokens.delete_many({"user_id": current_user["id"]})
-        await db.twitter_temp_tokens.insert_one({
-            "user_id": current_user["id"],
-            "code_verifier": code_verifier,
-            "state": state,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        })
+        # Generate signed state with user_id encoded (for linking callback to user)
+        state = create_oauth_state(current_user["id"])
+        
+        # Store PKCE verifier and state for this user; created_at is a BSON date for the TTL index
+        await db.twitter_temp_tokens.update_one(
+            {"user_id": current_user["id"]},
+            {"$set": {
+                "code_verifier": code_verifier,
+                "state": state,
+                "created_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
         
         # Build OAuth 2.0 authorization URL
         scopes = "tweet.read tweet.write users.read offline.access"
@@ -458,28 +1429,24 @@ async def twitter_callback(code: str, state: str, request: Request):
     callback_url = os.environ.get('TWITTER_CALLBACK_URL')
     
     try:
-        # Decode state to get user_id
+        # Verify the state signature to prevent CSRF attacks, and decode it to get user_id
         try:
-            state_data = json.loads(base64.urlsafe_b64decode(state.encode()).decode())
+            state_data = decode_oauth_state(state)
             user_id = state_data.get("user_id")
-        except Exception as e:
+        except jwt.ExpiredSignatureError:
+            return RedirectResponse(url=f"{frontend_url}?twitter_error=session_expired")
+        except jwt.InvalidTokenError as e:
             logging.error(f"Failed to decode state: {e}")
-            return RedirectResponse(url=f"{frontend_url}?twitter_error=invalid_state")
+            return RedirectResponse(url=f"{frontend_url}?twitter_error=csrf_validation_failed")
         
         if not user_id:
             return RedirectResponse(url=f"{frontend_url}?twitter_error=missing_user_id")
         
-        # Retrieve stored PKCE verifier and state
-        temp_token = await db.twitter_temp_tokens.find_one({"user_id": user_id}, {"_id": 0})
-        if not temp_token:
+        # Retrieve stored PKCE verifier; a missing one means the flow expired or was superseded
+        code_verifier = await pop_code_verifier(user_id, state)
+        if not code_verifier:
             return RedirectResponse(url=f"{frontend_url}?twitter_error=session_expired")
         
-        # Verify state to prevent CSRF attacks
-        if temp_token.get('state') != state:
-            return RedirectResponse(url=f"{frontend_url}?twitter_error=csrf_validation_failed")
-        
-        code_verifier = temp_token.get('code_verifier')
-        
         # Exchange authorization code for access token
         token_url = "https://api.twitter.com/2/oauth2/token"
         
@@ -528,8 +1495,6 @@ async def twitter_callback(code: str, state: str, request: Request):
         
         # Store Twitter account info with OAuth 2.0 tokens
         twitter_account_doc = {
-            "user_id": user_id,
-            "twitter_id": twitter_user['id'],
             "screen_name": twitter_user['username'],
             "name": twitter_user['name'],
             "profile_image_url": twitter_user.get('profile_image_url', ''),
@@ -538,10 +1503,15 @@ async def twitter_callback(code: str, state: str, request: Request):
             "connected_at": datetime.now(timezone.utc).isoformat()
         }
         
-        # Replace any existing Twitter account for this user
-        await db.twitter_accounts.delete_many({"user_id": user_id})
-        await db.twitter_accounts.insert_one(twitter_account_doc)
-        await db.twitter_temp_tokens.delete_many({"user_id": user_id})
+        # A user may connect several Twitter accounts; reconnecting one refreshes its tokens
+        account_id = str(uuid.uuid4())
+        result = await db.twitter_accounts.update_one(
+            {"user_id": user_id, "twitter_id": twitter_user['id']},
+            {"$set": twitter_account_doc, "$setOnInsert": {"id": account_id}},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            await link_schedules(user_id, "twitter_account_id", account_id)
         
         # Redirect to frontend with success
         return RedirectResponse(url=f"{frontend_url}?twitter_success=true&screen_name={twitter_user['username']}")
@@ -551,9 +1521,10 @@ async def twitter_callback(code: str, state: str, request: Request):
         return RedirectResponse(url=f"{frontend_url}?twitter_error=unexpected_error")
 
 @api_router.get("/twitter/account", response_model=TwitterAccountResponse)
-async def get_twitter_account(current_user: dict = Depends(get_current_user)):
-    account = await db.twitter_accounts.find_one(
-        {"user_id": current_user["id"]}, 
+async def get_twitter_account(account_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    account = await resolve_twitter_account(
+        current_user["id"],
+        account_id,
         {"_id": 0, "access_token": 0, "refresh_token": 0}
     )
     if not account:
@@ -561,70 +1532,208 @@ async def get_twitter_account(current_user: dict = Depends(get_current_user)):
     
     return TwitterAccountResponse(**account)
 
+@api_router.get("/twitter/accounts", response_model=List[TwitterAccountResponse])
+async def list_twitter_accounts(current_user: dict = Depends(get_current_user)):
+    accounts = await db.twitter_accounts.find(
+        {"user_id": current_user["id"]},
+        {"_id": 0, "access_token": 0, "refresh_token": 0}
+    ).sort("connected_at", -1).to_list(None)
+    
+    return [TwitterAccountResponse(**account) for account in accounts]
+
 @api_router.delete("/twitter/disconnect")
-async def disconnect_twitter(current_user: dict = Depends(get_current_user)):
-    result = await db.twitter_accounts.delete_many({"user_id": current_user["id"]})
+async def disconnect_twitter(account_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    query = {"user_id": current_user["id"]}
+    if account_id:
+        query["id"] = account_id
+    result = await db.twitter_accounts.delete_many(query)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="No Twitter account connected")
     return {"message": "Twitter account disconnected successfully"}
 
 # ===== Content Config Routes =====
-@api_router.post("/content-config", response_model=ContentConfigResponse)
-async def create_content_config(config: ContentConfigCreate, current_user: dict = Depends(get_current_user)):
+async def insert_content_config(config: ContentConfigCreate, user_id: str) -> ContentConfigResponse:
     config_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
     config_doc = {
         "id": config_id,
-        "user_id": current_user["id"],
+        "user_id": user_id,
         **config.model_dump(),
         "created_at": now,
         "updated_at": now
     }
     
-    await db.content_configs.delete_many({"user_id": current_user["id"]})
     await db.content_configs.insert_one(config_doc)
+    await link_schedules(user_id, "content_config_id", config_id)
     
     return ContentConfigResponse(**{k: v for k, v in config_doc.items() if k != "user_id"})
 
+async def only_document_id(collection, user_id: str, detail: str) -> Optional[str]:
+    """`id` of the user's only document in `collection`, None if they have none"""
+    docs = await collection.find({"user_id": user_id}, {"_id": 0, "id": 1}).limit(2).to_list(2)
+    if len(docs) > 1:
+        raise HTTPException(status_code=409, detail=detail)
+    return docs[0]["id"] if docs else None
+
+@api_router.post("/content-config", response_model=ContentConfigResponse)
+async def create_content_config(config: ContentConfigCreate, current_user: dict = Depends(get_current_user)):
+    """Create the user's content config, or update it if they have exactly one"""
+    config_id = await only_document_id(
+        db.content_configs, current_user["id"],
+        "Several content configurations exist; use PUT /content-config/{id} or POST /content-configs"
+    )
+    if config_id:
+        return await update_content_config(config_id, config, current_user)
+    return await insert_content_config(config, current_user["id"])
+
+@api_router.post("/content-configs", response_model=ContentConfigResponse)
+async def add_content_config(config: ContentConfigCreate, current_user: dict = Depends(get_current_user)):
+    """Add another content config"""
+    return await insert_content_config(config, current_user["id"])
+
 @api_router.get("/content-config", response_model=ContentConfigResponse)
-async def get_content_config(current_user: dict = Depends(get_current_user)):
-    config = await db.content_configs.find_one({"user_id": current_user["id"]}, {"_id": 0, "user_id": 0})
+async def get_content_config(config_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    config = await resolve_content_config(current_user["id"], config_id, {"_id": 0, "user_id": 0})
     if not config:
         raise HTTPException(status_code=404, detail="No content configuration found")
     return ContentConfigResponse(**config)
 
+@api_router.get("/content-configs", response_model=List[ContentConfigResponse])
+async def list_content_configs(current_user: dict = Depends(get_current_user)):
+    configs = await db.content_configs.find(
+        {"user_id": current_user["id"]},
+        {"_id": 0, "user_id": 0}
+    ).sort("updated_at", -1).to_list(None)
+    
+    return [ContentConfigResponse(**config) for config in configs]
+
+@api_router.put("/content-config/{config_id}", response_model=ContentConfigResponse)
+async def update_content_config(config_id: str, config: ContentConfigCreate, current_user: dict = Depends(get_current_user)):
+    updated = await db.content_configs.find_one_and_update(
+        {"id": config_id, "user_id": current_user["id"]},
+        {"$set": {**config.model_dump(), "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "user_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="No content configuration found")
+    return ContentConfigResponse(**updated)
+
+@api_router.delete("/content-config/{config_id}")
+async def delete_content_config(config_id: str, current_user: dict = Depends(get_current_user)):
+    result = await db.content_configs.delete_one({"id": config_id, "user_id": current_user["id"]})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="No content configuration found")
+    return {"message": "Content configuration deleted successfully"}
+
 # ===== Schedule Routes =====
-@api_router.post("/schedule", response_model=ScheduleResponse)
-async def create_schedule(schedule: ScheduleCreate, current_user: dict = Depends(get_current_user)):
+async def resolve_schedule_links(schedule: ScheduleCreate, user_id: str, current: Optional[dict] = None) -> dict:
+    """
+    The account and config a saved schedule links to.
+    
+    Explicit ids must belong to the user; an omitted one keeps the schedule's current
+    link, or else links the user's newest account / config as of now.
+    """
+    links = {}
+    for field, resolve, detail in (
+        ("twitter_account_id", resolve_twitter_account, "Twitter account not found"),
+        ("content_config_id", resolve_content_config, "Content configuration not found"),
+    ):
+        link_id = getattr(schedule, field) or (current or {}).get(field)
+        doc = await resolve(user_id, link_id, {"_id": 0, "id": 1})
+        if link_id and not doc:
+            raise HTTPException(status_code=404, detail=detail)
+        links[field] = doc["id"] if doc else None
+    return links
+
+async def insert_schedule(schedule: ScheduleCreate, user_id: str) -> ScheduleResponse:
+    links = await resolve_schedule_links(schedule, user_id)
     schedule_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
     schedule_doc = {
         "id": schedule_id,
-        "user_id": current_user["id"],
+        "user_id": user_id,
         **schedule.model_dump(),
+        **links,
+        "jitter": stable_jitter(schedule_id),
         "created_at": now,
         "updated_at": now
     }
     
-    
-    await db.schedules.delete_many({"user_id": current_user["id"]})
     await db.schedules.insert_one(schedule_doc)
     
     return ScheduleResponse(**{k: v for k, v in schedule_doc.items() if k != "user_id"})
 
+@api_router.post("/schedule", response_model=ScheduleResponse)
+async def create_schedule(schedule: ScheduleCreate, current_user: dict = Depends(get_current_user)):
+    """Create the user's schedule, or update it if they have exactly one"""
+    schedule_id = await only_document_id(
+        db.schedules, current_user["id"],
+        "Several schedules exist; use PUT /schedule/{id} or POST /schedules"
+    )
+    if schedule_id:
+        return await update_schedule(schedule_id, schedule, current_user)
+    return await insert_schedule(schedule, current_user["id"])
+
+@api_router.post("/schedules", response_model=ScheduleResponse)
+async def add_schedule(schedule: ScheduleCreate, current_user: dict = Depends(get_current_user)):
+    """Add another schedule"""
+    return await insert_schedule(schedule, current_user["id"])
+
 @api_router.get("/schedule", response_model=ScheduleResponse)
-async def get_schedule(current_user: dict = Depends(get_current_user)):
-    schedule = await db.schedules.find_one({"user_id": current_user["id"]}, {"_id": 0, "user_id": 0})
+async def get_schedule(schedule_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    query = {"user_id": current_user["id"]}
+    if schedule_id:
+        query["id"] = schedule_id
+    schedule = await db.schedules.find_one(query, {"_id": 0, "user_id": 0}, sort=[("updated_at", -1)])
     if not schedule:
         raise HTTPException(status_code=404, detail="No schedule found")
     return ScheduleResponse(**schedule)
 
-@api_router.patch("/schedule/toggle")
-async def toggle_schedule(enabled: bool, current_user: dict = Depends(get_current_user)):
-    result = await db.schedules.update_one(
+@api_router.get("/schedules", response_model=List[ScheduleResponse])
+async def list_schedules(current_user: dict = Depends(get_current_user)):
+    schedules = await db.schedules.find(
         {"user_id": current_user["id"]},
+        {"_id": 0, "user_id": 0}
+    ).sort("updated_at", -1).to_list(None)
+    
+    return [ScheduleResponse(**schedule) for schedule in schedules]
+
+@api_router.put("/schedule/{schedule_id}", response_model=ScheduleResponse)
+async def update_schedule(schedule_id: str, schedule: ScheduleCreate, current_user: dict = Depends(get_current_user)):
+    current = await db.schedules.find_one(
+        {"id": schedule_id, "user_id": current_user["id"]},
+        {"_id": 0, "twitter_account_id": 1, "content_config_id": 1}
+    )
+    if not current:
+        raise HTTPException(status_code=404, detail="No schedule found")
+    links = await resolve_schedule_links(schedule, current_user["id"], current)
+    updated = await db.schedules.find_one_and_update(
+        {"id": schedule_id, "user_id": current_user["id"]},
+        {"$set": {**schedule.model_dump(), **links, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "user_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="No schedule found")
+    return ScheduleResponse(**updated)
+
+@api_router.delete("/schedule/{schedule_id}")
+async def delete_schedule(schedule_id: str, current_user: dict = Depends(get_current_user)):
+    result = await db.schedules.delete_one({"id": schedule_id, "user_id": current_user["id"]})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="No schedule found")
+    return {"message": "Schedule deleted successfully"}
+
+@api_router.patch("/schedule/toggle")
+async def toggle_schedule(enabled: bool, schedule_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    query = {"user_id": current_user["id"]}
+    if schedule_id:
+        query["id"] = schedule_id
+    result = await db.schedules.update_many(
+        query,
         {"$set": {"enabled": enabled, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
@@ -634,56 +1743,47 @@ async def toggle_schedule(enabled: bool, current_user: dict = Depends(get_curren
     return {"message": f"Automation {'enabled' if enabled else 'disabled'} successfully", "enabled": enabled}
 
 # ===== Post Routes =====
-@api_router.post("/posts/generate", response_model=PostResponse)
-async def generate_test_post(current_user: dict = Depends(get_current_user)):
-    twitter_account = await db.twitter_accounts.find_one({"user_id": current_user["id"]}, {"_id": 0})
-    if not twitter_account:
-        raise HTTPException(status_code=400, detail="No Twitter account connected")
-    
-    content_config = await db.content_configs.find_one({"user_id": current_user["id"]}, {"_id": 0})
-    if not content_config:
-        raise HTTPException(status_code=400, detail="No content configuration found")
+@api_router.post("/posts/generate", response_model=PostResponse, dependencies=[Depends(limit_generate), Depends(admit_generation)])
+async def generate_test_post(
+    account_id: Optional[str] = None,
+    config_id: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: dict = Depends(get_current_user)
+):
+    # Retries carrying the same Idempotency-Key get the first request's result back
+    key = f"generate:{current_user['id']}:{idempotency_key}" if idempotency_key else None
+    if key:
+        existing = await claim_idempotency_key(key, current_user["id"])
+        if existing:
+            if existing["status"] == "completed":
+                return PostResponse(**existing["response"])
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
     
     try:
-        tweet_text = await generate_tweet(content_config, current_user["id"])
+        twitter_account = await resolve_twitter_account(current_user["id"], account_id)
+        if not twitter_account:
+            raise HTTPException(status_code=400, detail="No Twitter account connected")
+        
+        content_config = await resolve_content_config(current_user["id"], config_id)
+        if not content_config:
+            raise HTTPException(status_code=400, detail="No content configuration found")
         
         try:
-            twitter_response = post_tweet_to_twitter(
-                twitter_account['access_token'],
-                tweet_text
-            )
-            
-            post_doc = {
-                "id": str(uuid.uuid4()),
-                "user_id": current_user["id"],
-                "content": tweet_text,
-                "twitter_id": twitter_response['data']['id'],
-                "status": "success",
-                "error_message": None,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "posted_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.posts.insert_one(post_doc)
-            
-            return PostResponse(**{k: v for k, v in post_doc.items() if k != "user_id"})
-            
-        except Exception as twitter_error:
-            post_doc = {
-                "id": str(uuid.uuid4()),
-                "user_id": current_user["id"],
-                "content": tweet_text,
-                "twitter_id": None,
-                "status": "failed",
-                "error_message": str(twitter_error),
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "posted_at": None
-            }
-            await db.posts.insert_one(post_doc)
-            
-            return PostResponse(**{k: v for k, v in post_doc.items() if k != "user_id"})
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate tweet: {str(e)}")
+            post_doc = await publish_tweet(current_user["id"], twitter_account, content_config)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate tweet: {str(e)}")
+    except HTTPException:
+        if key:
+            await release_idempotency_key(key)
+        raise
+    
+    response = {k: v for k, v in post_doc.items() if k != "user_id"}
+    if key:
+        await complete_idempotency_key(key, response)
+    
+    return PostResponse(**response)
 
 @api_router.get("/posts", response_model=List[PostResponse])
 async def get_posts(limit: int = 50, current_user: dict = Depends(get_current_user)):
@@ -700,8 +1800,7 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
     successful_posts = await db.posts.count_documents({"user_id": current_user["id"], "status": "success"})
     failed_posts = await db.posts.count_documents({"user_id": current_user["id"], "status": "failed"})
     
-    schedule = await db.schedules.find_one({"user_id": current_user["id"], "enabled": True}, {"_id": 0})
-    scheduled_posts = 1 if schedule else 0
+    scheduled_posts = await db.schedules.count_documents({"user_id": current_user["id"], "enabled": True})
     
     return StatsResponse(
         total_posts=total_posts,
@@ -710,9 +1809,257 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
         scheduled_posts=scheduled_posts
     )
 
+@api_router.get("/analytics", response_model=AnalyticsResponse)
+async def get_analytics(
+    granularity: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Post counts, success rate and failure reasons per hour or day.
+    
+    Served from the rollups with one indexed range read; only buckets with posts
+    are returned. `start` and `end` are ISO dates or datetimes (UTC when no offset).
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be 'hour' or 'day'")
+    
+    now = datetime.now(timezone.utc)
+    end_at = parse_range_bound(end, now)
+    start_at = parse_range_bound(start, end_at - (timedelta(hours=48) if granularity == "hour" else timedelta(days=30)))
+    if start_at > end_at:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    await backfill_post_rollups(current_user["id"])
+    
+    first_bucket = to_bucket(start_at, granularity)
+    last_bucket = to_bucket(end_at, granularity)
+    buckets = await db.post_rollups.find(
+        {"user_id": current_user["id"], "granularity": granularity, "bucket": {"$gte": first_bucket, "$lte": last_bucket}},
+        {"_id": 0, "bucket": 1, "total": 1, "success": 1, "failed": 1, "failure_reasons": 1, "backfill": 1}
+    ).sort("bucket", 1).to_list(None)
+    buckets = [merge_backfill(bucket) for bucket in buckets]
+    
+    return AnalyticsResponse(
+        granularity=granularity,
+        start=first_bucket,
+        end=last_bucket,
+        buckets=buckets,
+        **summarize(buckets)
+    )
+
+# ===== Bulk Admin Routes =====
+async def require_admin(x_admin_key: Optional[str] = Header(None, alias="X-Admin-Key")):
+    if not ADMIN_API_KEY or not x_admin_key or not secrets.compare_digest(x_admin_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+async def iter_bulk_rows(request: Request):
+    """
+    Yield (row number, raw row) from an NDJSON or JSON array body.
+    
+    NDJSON is read from the request stream line by line; raw rows are bytes for
+    NDJSON and already-decoded values for JSON arrays. Blank lines are skipped but
+    still counted, so row numbers always match input line numbers (from 0).
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        row = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield row, line
+                row += 1
+        if buffer.strip():
+            yield row, buffer
+        return
+    
+    try:
+        rows = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    for row, item in enumerate(rows):
+        yield row, item
+
+def raw_row_id(raw) -> Optional[str]:
+    """The `id` of a row that failed validation, if it can still be read"""
+    if isinstance(raw, bytes):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return None
+    row_id = raw.get("id") if isinstance(raw, dict) else None
+    return row_id if isinstance(row_id, str) else None
+
+async def unknown_users(batch: list) -> set:
+    user_ids = {item.user_id for _, item in batch}
+    found = await db.users.distinct("id", {"id": {"$in": list(user_ids)}})
+    return user_ids - set(found)
+
+async def check_config_rows(batch: list) -> dict:
+    missing = await unknown_users(batch)
+    return {row: "User not found" for row, item in batch if item.user_id in missing}
+
+async def check_schedule_rows(batch: list) -> dict:
+    """
+    Reject rows for unknown users or linking accounts/configs the user does not own.
+    
+    Omitted links are filled in on the rows the way resolve_schedule_links does: an
+    existing schedule keeps its links, a new one gets the user's newest account / config.
+    """
+    missing = await unknown_users(batch)
+    user_ids = list({item.user_id for _, item in batch})
+    existing = await db.schedules.find(
+        {"id": {"$in": [item.id for _, item in batch if item.id]}},
+        {"_id": 0, "id": 1, "user_id": 1, "twitter_account_id": 1, "content_config_id": 1}
+    ).to_list(None)
+    current = {(doc["user_id"], doc["id"]): doc for doc in existing}
+    defaults = {
+        "twitter_account_id": await newest_ids(db.twitter_accounts, "connected_at", user_ids),
+        "content_config_id": await newest_ids(db.content_configs, "updated_at", user_ids),
+    }
+    for _, item in batch:
+        for field, newest in defaults.items():
+            if not getattr(item, field):
+                link_id = current.get((item.user_id, item.id), {}).get(field) or newest.get(item.user_id)
+                setattr(item, field, link_id)
+    
+    account_ids = [item.twitter_account_id for _, item in batch if item.twitter_account_id]
+    config_ids = [item.content_config_id for _, item in batch if item.content_config_id]
+    accounts = await db.twitter_accounts.find({"id": {"$in": account_ids}}, {"_id": 0, "id": 1, "user_id": 1}).to_list(None)
+    configs = await db.content_configs.find({"id": {"$in": config_ids}}, {"_id": 0, "id": 1, "user_id": 1}).to_list(None)
+    account_owners = {doc["id"]: doc["user_id"] for doc in accounts}
+    config_owners = {doc["id"]: doc["user_id"] for doc in configs}
+    
+    rejected = {}
+    for row, item in batch:
+        if item.user_id in missing:
+            rejected[row] = "User not found"
+        elif item.twitter_account_id and account_owners.get(item.twitter_account_id) != item.user_id:
+            rejected[row] = "Twitter account not found"
+        elif item.content_config_id and config_owners.get(item.content_config_id) != item.user_id:
+            rejected[row] = "Content configuration not found"
+    return rejected
+
+def config_upsert(item: BulkContentConfigRow, doc_id: str, now: str) -> UpdateOne:
+    # An update that does not name a prompt_version keeps the one the config has
+    fields = item.model_dump(exclude={"id", "user_id", "prompt_version"})
+    on_insert = {"created_at": now}
+    if "prompt_version" in item.model_fields_set:
+        fields["prompt_version"] = item.prompt_version
+    else:
+        on_insert["prompt_version"] = item.prompt_version
+    return UpdateOne(
+        {"id": doc_id, "user_id": item.user_id},
+        {"$set": {**fields, "updated_at": now}, "$setOnInsert": on_insert},
+        upsert=True
+    )
+
+def schedule_upsert(item: BulkScheduleRow, doc_id: str, now: str) -> UpdateOne:
+    fields = item.model_dump(exclude={"id", "user_id"})
+    return UpdateOne(
+        {"id": doc_id, "user_id": item.user_id},
+        {"$set": {**fields, "updated_at": now}, "$setOnInsert": {"created_at": now, "jitter": stable_jitter(doc_id)}},
+        upsert=True
+    )
+
+async def write_bulk_batch(collection, batch: list, check_rows, build_op) -> list:
+    """Validate one batch against the database and write it with a single unordered bulk_write"""
+    rejected = await check_rows(batch)
+    now = datetime.now(timezone.utc).isoformat()
+    results = []
+    ops = []
+    written = []
+    for row, item in batch:
+        if row in rejected:
+            results.append({"row": row, "id": item.id, "status": "failed", "error": rejected[row]})
+            continue
+        doc_id = item.id or str(uuid.uuid4())
+        ops.append(build_op(item, doc_id, now))
+        written.append((row, doc_id))
+    
+    if not ops:
+        return results
+    
+    try:
+        details = (await collection.bulk_write(ops, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+    upserted = {entry["index"] for entry in details.get("upserted", [])}
+    errors = {
+        entry["index"]: "id already belongs to another user" if entry.get("code") == 11000 else entry.get("errmsg")
+        for entry in details.get("writeErrors", [])
+    }
+    
+    for index, (row, doc_id) in enumerate(written):
+        if index in errors:
+            results.append({"row": row, "id": doc_id, "status": "failed", "error": errors[index]})
+        else:
+            results.append({"row": row, "id": doc_id, "status": "created" if index in upserted else "updated"})
+    return results
+
+async def bulk_upsert(request: Request, collection, row_model, check_rows, build_op) -> BulkUpsertResponse:
+    results = []
+    batch = []
+    async for row, raw in iter_bulk_rows(request):
+        try:
+            item = row_model.model_validate_json(raw) if isinstance(raw, bytes) else row_model.model_validate(raw)
+        except ValidationError as e:
+            error = e.errors()[0]
+            location = ".".join(str(part) for part in error["loc"])
+            results.append({
+                "row": row,
+                "id": raw_row_id(raw),
+                "status": "failed",
+                "error": f"{location}: {error['msg']}" if location else error["msg"]
+            })
+            continue
+        
+        batch.append((row, item))
+        if len(batch) >= BULK_BATCH_SIZE:
+            results.extend(await write_bulk_batch(collection, batch, check_rows, build_op))
+            batch = []
+    if batch:
+        results.extend(await write_bulk_batch(collection, batch, check_rows, build_op))
+    
+    results.sort(key=lambda result: result["row"])
+    counts = Counter(result["status"] for result in results)
+    return BulkUpsertResponse(
+        created=counts["created"],
+        updated=counts["updated"],
+        failed=counts["failed"],
+        results=results
+    )
+
+@api_router.post("/admin/bulk/content-configs", response_model=BulkUpsertResponse, dependencies=[Depends(require_admin)])
+async def bulk_upsert_content_configs(request: Request):
+    """Create or update content configs from a JSON array or NDJSON body; rows with an `id` update it"""
+    return await bulk_upsert(request, db.content_configs, BulkContentConfigRow, check_config_rows, config_upsert)
+
+@api_router.post("/admin/bulk/schedules", response_model=BulkUpsertResponse, dependencies=[Depends(require_admin)])
+async def bulk_upsert_schedules(request: Request):
+    """Create or update schedules from a JSON array or NDJSON body; rows with an `id` update it"""
+    return await bulk_upsert(request, db.schedules, BulkScheduleRow, check_schedule_rows, schedule_upsert)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Shed load once too many requests are in flight (registered first so CORS wraps the 503)
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    if request.url.path in ("/metrics", "/ready"):
+        return await call_next(request)
+    try:
+        async with request_admission.admit():
+            return await call_next(request)
+    except Overloaded:
+        return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -721,6 +2068,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses big enough to benefit (e.g. /api/posts pages)
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -730,17 +2080,86 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    global scheduler_lock
+    for name, reason in generation_router.skipped.items():
+        logger.warning(f"Generation provider '{name}' skipped: {reason}")
+    if not generation_router.providers:
+        logger.warning("No generation provider is configured; tweet generation will fail until one is")
+    
+    # Refuses to start without the unique indexes duplicate protection depends on
+    await ensure_indexes()
+    
+    try:
+        await backfill_twitter_account_ids()
+    except Exception as e:
+        logger.error(f"Twitter account id backfill failed: {e}")
+    try:
+        await backfill_schedule_links()
+    except Exception as e:
+        logger.error(f"Schedule link backfill failed: {e}")
+    try:
+        await backfill_schedule_jitter()
+    except Exception as e:
+        logger.error(f"Schedule jitter backfill failed: {e}")
+    try:
+        await backfill_fingerprints()
+    except Exception as e:
+        logger.error(f"Fingerprint backfill failed: {e}")
+    
+    scheduler_lock = acquire_scheduler_lock()
+    if not scheduler_lock:
+        logger.info("Scheduler is running in another worker, not starting it here")
+        return
+    
+    # One run at a time: a tick due while the previous run is still going is skipped
+    # (and counted), and ticks missed while the event loop was busy collapse into one
     scheduler.add_job(
-        process_scheduled_posts,
+        run_scheduled_posts,
         CronTrigger(hour='*', minute=0),
         id='scheduled_posts',
-        replace_existing=True
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=SCHEDULER_MISFIRE_GRACE_SECONDS
     )
+    scheduler.add_listener(on_scheduler_job_skipped, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
     scheduler.start()
     logger.info("Scheduler started")
+    
+    try:
+        resume_from = await find_resumable_slot()
+    except Exception as e:
+        logger.error(f"Could not check for interrupted scheduler runs: {e}")
+        resume_from = None
+    if resume_from is not None:
+        logger.info(f"Resuming this hour's scheduled posts from jitter {resume_from:.3f}")
+        scheduler_run_stats["resumed"] += 1
+        scheduler.add_job(
+            run_scheduled_posts,
+            kwargs={"slot": current_slot(), "resume_from": resume_from},
+            id='scheduled_posts_resume',
+            replace_existing=True
+        )
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    scheduler.shutdown()
+    if scheduler.running:
+        # Stop new runs and dispatching, then give posts in flight until the drain
+        # deadline; whatever is left is cancelled and the run checkpoints it, so the
+        # next start resumes this slot from there
+        scheduler_stopping.set()
+        scheduler.shutdown(wait=False)
+        in_flight = active_scheduler_runs | scheduled_post_tasks
+        if in_flight:
+            logger.info("Waiting for scheduled posts run to finish")
+            _, pending = await asyncio.wait(in_flight, timeout=SCHEDULER_DRAIN_SECONDS)
+            if pending:
+                logger.warning("Scheduled posts run did not finish before the drain deadline, checkpointing it")
+                for task in pending:
+                    task.cancel()
+                await asyncio.wait(pending, timeout=5)
+        if publishing_tasks:
+            # Tweets already sent must be recorded before Mongo closes
+            await asyncio.wait(publishing_tasks, timeout=SCHEDULER_DRAIN_SECONDS)
     client.close()
     logger.info("Application shutdown")
\ No newline at end of file
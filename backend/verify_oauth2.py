@@ -2,31 +2,63 @@
 """
 Twitter OAuth 2.0 Verification Script
 Validates all components of the OAuth 2.0 implementation
+
+The checks are independent, so they run concurrently on one shared HTTP client;
+each check's output is printed in order once all have finished, followed by a
+timing table. With --latency the script also samples the main endpoints and
+reports latency percentiles, doubling as a quick smoke benchmark.
+
+Usage:
+    python verify_oauth2.py
+    python verify_oauth2.py --base-url https://api.example.com --latency 50 --concurrency 5
 """
+import argparse
+import asyncio
+import contextvars
 import os
 import sys
-import requests
+import time
+import httpx
 from dotenv import load_dotenv
 from pathlib import Path
 
 # Load environment variables
 load_dotenv(Path(__file__).parent / '.env')
 
+TEST_USER = {
+    "email": "verify_oauth@test.com",
+    "password": "testpass123",
+    "name": "OAuth Verifier"
+}
+
+# Output lines of the check running in the current task; None prints directly
+check_output = contextvars.ContextVar('check_output', default=None)
+
+def emit(line):
+    lines = check_output.get()
+    if lines is None:
+        print(line)
+    else:
+        lines.append(line)
+
 def print_header(text):
-    print("\n" + "=" * 60)
-    print(f"  {text}")
-    print("=" * 60)
+    emit("\n" + "=" * 60)
+    emit(f"  {text}")
+    emit("=" * 60)
 
 def print_success(text):
-    print(f"✅ {text}")
+    emit(f"✅ {text}")
 
 def print_error(text):
-    print(f"❌ {text}")
+    emit(f"❌ {text}")
 
 def print_info(text):
-    print(f"ℹ️  {text}")
+    emit(f"ℹ️  {text}")
+
+def print_detail(text):
+    emit(f"   {text}")
 
-def check_environment_variables():
+async def check_environment_variables(client, args):
     """Verify all required environment variables are set"""
     print_header("1. Environment Variables Check")
     
@@ -45,31 +77,31 @@ def check_environment_variables():
         if value and value != f'your-{var.lower()}-here':
             print_success(f"{description}: Set")
             if var in ['TWITTER_CLIENT_ID', 'TWITTER_CLIENT_SECRET', 'OPENAI_API_KEY']:
-                print(f"   Value: {value[:15]}...{value[-5:]}")
+                print_detail(f"Value: {value[:15]}...{value[-5:]}")
             else:
-                print(f"   Value: {value}")
+                print_detail(f"Value: {value}")
         else:
             print_error(f"{description}: NOT SET")
             all_present = False
     
     return all_present
 
-def check_backend_health():
+async def check_backend_health(client, args):
     """Check if backend server is running"""
     print_header("2. Backend Server Health Check")
     
     try:
-        response = requests.get('http://localhost:8001/', timeout=5)
+        response = await client.get(f'{args.base_url}/')
         if response.status_code == 200:
             data = response.json()
             print_success(f"Backend is running")
-            print(f"   Status: {data.get('status')}")
-            print(f"   Service: {data.get('service')}")
+            print_detail(f"Status: {data.get('status')}")
+            print_detail(f"Service: {data.get('service')}")
             return True
         else:
             print_error(f"Backend returned status code {response.status_code}")
             return False
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print_error("Backend is not running or not accessible")
         print_info("Run: sudo supervisorctl restart backend")
         return False
@@ -77,52 +109,37 @@ def check_backend_health():
         print_error(f"Error checking backend: {str(e)}")
         return False
 
-def check_oauth_endpoints():
+async def get_test_user_token(client, args):
+    """Sign up the verification user, or log in when it already exists; returns (token, created)"""
+    response = await client.post(f'{args.base_url}/api/auth/signup', json=TEST_USER)
+    
+    if response.status_code == 200:
+        return response.json().get('access_token'), True
+    if response.status_code == 400:
+        # User already exists, try login
+        response = await client.post(
+            f'{args.base_url}/api/auth/login',
+            json={"email": TEST_USER["email"], "password": TEST_USER["password"]}
+        )
+        if response.status_code == 200:
+            return response.json().get('access_token'), False
+    raise RuntimeError(f"Failed to create/login test user: {response.text}")
+
+async def check_oauth_endpoints(client, args):
     """Check if OAuth endpoints are accessible"""
     print_header("3. OAuth 2.0 Endpoints Check")
     
-    # First, create a test user
     try:
-        signup_data = {
-            "email": "verify_oauth@test.com",
-            "password": "testpass123",
-            "name": "OAuth Verifier"
-        }
-        
-        response = requests.post(
-            'http://localhost:8001/api/auth/signup',
-            json=signup_data,
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            token = response.json().get('access_token')
+        token, created = await get_test_user_token(client, args)
+        if created:
             print_success("Test user created successfully")
-            print(f"   Token: {token[:20]}...")
-        elif response.status_code == 400:
-            # User already exists, try login
-            login_data = {
-                "email": signup_data["email"],
-                "password": signup_data["password"]
-            }
-            response = requests.post(
-                'http://localhost:8001/api/auth/login',
-                json=login_data,
-                timeout=5
-            )
-            token = response.json().get('access_token')
-            print_success("Test user login successful")
+            print_detail(f"Token: {token[:20]}...")
         else:
-            print_error(f"Failed to create/login test user: {response.text}")
-            return False
+            print_success("Test user login successful")
         
         # Test OAuth auth-url endpoint
         headers = {'Authorization': f'Bearer {token}'}
-        auth_response = requests.get(
-            'http://localhost:8001/api/twitter/auth-url',
-            headers=headers,
-            timeout=5
-        )
+        auth_response = await client.get(f'{args.base_url}/api/twitter/auth-url', headers=headers)
         
         if auth_response.status_code == 200:
             auth_data = auth_response.json()
@@ -130,8 +147,8 @@ def check_oauth_endpoints():
             state = auth_data.get('state')
             
             print_success("OAuth authorization URL generated")
-            print(f"   URL: {auth_url[:80]}...")
-            print(f"   State: {state}")
+            print_detail(f"URL: {auth_url[:80]}...")
+            print_detail(f"State: {state}")
             
             # Validate URL components
             if 'twitter.com/i/oauth2/authorize' in auth_url:
@@ -156,12 +173,12 @@ def check_oauth_endpoints():
         else:
             print_error(f"Failed to get auth URL: {auth_response.text}")
             return False
-            
+    
     except Exception as e:
         print_error(f"Error testing OAuth endpoints: {str(e)}")
         return False
 
-def check_twitter_credentials():
+async def check_twitter_credentials(client, args):
     """Validate Twitter API credentials format"""
     print_header("4. Twitter Credentials Validation")
     
@@ -175,53 +192,126 @@ def check_twitter_credentials():
     # OAuth 2.0 client IDs are typically base64-like strings
     if len(client_id) > 10:
         print_success("Client ID format looks valid")
-        print(f"   Length: {len(client_id)} characters")
+        print_detail(f"Length: {len(client_id)} characters")
     else:
         print_error("Client ID seems too short")
         return False
     
     if len(client_secret) > 20:
         print_success("Client Secret format looks valid")
-        print(f"   Length: {len(client_secret)} characters")
+        print_detail(f"Length: {len(client_secret)} characters")
     else:
         print_error("Client Secret seems too short")
         return False
     
     return True
 
-def check_database_connection():
+async def check_database_connection(client, args):
     """Check MongoDB connection"""
     print_header("5. Database Connection Check")
     
     try:
         from motor.motor_asyncio import AsyncIOMotorClient
-        import asyncio
-        
-        mongo_url = os.environ.get('MONGO_URL')
-        
-        async def test_connection():
-            client = AsyncIOMotorClient(mongo_url)
-            try:
-                # Ping the database
-                await client.admin.command('ping')
-                return True
-            except Exception as e:
-                print_error(f"MongoDB connection failed: {str(e)}")
-                return False
-            finally:
-                client.close()
         
-        result = asyncio.run(test_connection())
-        if result:
-            print_success("MongoDB connection successful")
-            return True
-        else:
+        mongo_client = AsyncIOMotorClient(os.environ.get('MONGO_URL'), serverSelectionTimeoutMS=int(args.timeout * 1000))
+        try:
+            # Ping the database
+            await mongo_client.admin.command('ping')
+        except Exception as e:
+            print_error(f"MongoDB connection failed: {str(e)}")
             return False
-            
+        finally:
+            mongo_client.close()
+        
+        print_success("MongoDB connection successful")
+        return True
+    
     except Exception as e:
         print_error(f"Error testing database: {str(e)}")
         return False
 
+CHECKS = {
+    'Environment Variables': check_environment_variables,
+    'Backend Server': check_backend_health,
+    'OAuth Endpoints': check_oauth_endpoints,
+    'Twitter Credentials': check_twitter_credentials,
+    'Database Connection': check_database_connection,
+}
+
+async def run_check(check, client, args):
+    """Run one check with its output buffered; returns (passed, seconds, output lines)"""
+    lines = []
+    check_output.set(lines)
+    start = time.perf_counter()
+    try:
+        passed = await check(client, args)
+    except Exception as e:
+        print_error(f"Check crashed: {str(e)}")
+        passed = False
+    return passed, time.perf_counter() - start, lines
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def sample_endpoint(client, url, headers, samples, concurrency):
+    """GET `url` `samples` times, `concurrency` at a time; returns latencies (ms) and error count"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+    
+    await asyncio.gather(*(one() for _ in range(samples)))
+    return latencies, errors
+
+async def measure_latency(client, args):
+    """Sample the health and main read endpoints and print latency percentiles"""
+    endpoints = ['/', '/ready']
+    headers = {}
+    try:
+        token, _ = await get_test_user_token(client, args)
+        headers = {'Authorization': f'Bearer {token}'}
+        endpoints += ['/api/auth/me', '/api/posts?limit=20', '/api/stats']
+    except Exception as e:
+        print_info(f"Sampling public endpoints only: {str(e)}")
+    
+    print_header(f"Endpoint Latency ({args.latency} samples, concurrency {args.concurrency})")
+    print(f"{'endpoint':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for endpoint in endpoints:
+        url = f'{args.base_url}{endpoint}'
+        # Warm up the connection before measuring
+        try:
+            await client.get(url, headers=headers)
+        except httpx.HTTPError:
+            pass
+        latencies, errors = await sample_endpoint(client, url, headers, args.latency, args.concurrency)
+        if latencies:
+            print(f"{endpoint:<22} {percentile(latencies, 0.5):>9.1f} {percentile(latencies, 0.95):>9.1f} "
+                  f"{percentile(latencies, 0.99):>9.1f} {max(latencies):>9.1f} {errors:>7}")
+        else:
+            print(f"{endpoint:<22} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {errors:>7}")
+
+def print_timings(results, total):
+    """Print how long each check took next to the wall time of the whole run"""
+    print_header("Check Timings")
+    print(f"{'check':<24} {'result':>6} {'ms':>9}")
+    for check_name, (passed, seconds, _) in results.items():
+        print(f"{check_name:<24} {'pass' if passed else 'fail':>6} {seconds * 1000:>9.1f}")
+    print(f"{'total (wall)':<24} {'':>6} {total * 1000:>9.1f}")
+
 def print_summary(checks):
     """Print final summary"""
     print_header("Verification Summary")
@@ -250,19 +340,32 @@ def print_summary(checks):
         print("\n⚠️  Some checks failed. Please review the errors above.")
         return False
 
-def main():
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--timeout", type=float, default=5, help="seconds per request")
+    parser.add_argument("--latency", type=int, default=0, metavar="N", help="sample each endpoint N times")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent requests while sampling")
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+    
     print("\n" + "🔍 Twitter OAuth 2.0 Verification Tool" + "\n")
     
-    checks = {
-        'Environment Variables': check_environment_variables(),
-        'Backend Server': check_backend_health(),
-        'OAuth Endpoints': check_oauth_endpoints(),
-        'Twitter Credentials': check_twitter_credentials(),
-        'Database Connection': check_database_connection(),
-    }
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*(run_check(check, client, args) for check in CHECKS.values()))
+        total = time.perf_counter() - start
+        results = dict(zip(CHECKS, outcomes))
+        
+        for _, _, lines in outcomes:
+            print("\n".join(lines))
+        print_timings(results, total)
+        
+        if args.latency > 0:
+            await measure_latency(client, args)
     
-    success = print_summary(checks)
-    sys.exit(0 if success else 1)
+    success = print_summary({check_name: passed for check_name, (passed, _, _) in results.items()})
+    return 0 if success else 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(asyncio.run(main()))